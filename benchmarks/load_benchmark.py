@@ -0,0 +1,61 @@
+"""Benchmarks how LogLoader's parallel ingestion scales with the number
+of log files being loaded.
+
+Example usage: python3 benchmarks/load_benchmark.py -r 20000 -c 100 -j 1 2 4 8
+"""
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from frc1678.limeplotter.loader.log import LogLoader
+
+def parse_args():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument("-F", "--file-counts", default=[1, 2, 4, 8, 16, 32],
+                        type=int, nargs="*",
+                        help="The numbers of log files to time loading")
+
+    parser.add_argument("-j", "--jobs", default=[1, 2, 4, 8], type=int,
+                        nargs="*", help="The worker counts to compare")
+
+    parser.add_argument("-r", "--rows", default=10000, type=int,
+                        help="Rows per generated log file")
+
+    parser.add_argument("-c", "--columns", default=50, type=int,
+                        help="Columns per generated log file")
+
+    return parser.parse_args()
+
+def write_logs(directory, count, rows, columns):
+    """Writes 'count' robot-like CSV logs into 'directory'"""
+    timestamps = np.arange(rows) * .02
+    for number in range(count):
+        data = {'timestamp': timestamps}
+        for column in range(columns):
+            data[f"value_{column}"] = np.sin(timestamps * (column + 1))
+        pd.DataFrame(data).to_csv(f"{directory}/log_{number}.csv",
+                                  index=False)
+
+def time_load(directory, workers):
+    start = time.perf_counter()
+    loader = LogLoader(sources=[directory], workers=workers)
+    loader.open()
+    return time.perf_counter() - start
+
+def main():
+    args = parse_args()
+
+    print("files " + " ".join([f"{'j=' + str(jobs):>9}" for jobs in args.jobs]))
+    for count in args.file_counts:
+        with tempfile.TemporaryDirectory() as directory:
+            write_logs(directory, count, args.rows, args.columns)
+            results = [time_load(directory, jobs) for jobs in args.jobs]
+        print(f"{count:5d} " + " ".join([f"{result:8.3f}s" for result in results]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Benchmarks lime-plotter reading live network tables data as the number
+of published keys grows.
+
+For each key count, a lime-server load generator is started locally and
+lime-plotter (using the non-interactive Agg backend) connects to it and
+animates every key for a while.  The sustained frames/sec, the capture
+latency (from when a value was published until it was stored) and the
+fraction of updates that were never captured are reported.
+
+Example usage: python3 benchmarks/networktables_benchmark.py -k 10 100 1000 -- --listen
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import yaml
+
+def parse_args():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument("-k", "--key-counts", default=[10, 50, 100, 500],
+                        type=int, nargs="*",
+                        help="The total numbers of keys to time")
+
+    parser.add_argument("-T", "--tables", default=2, type=int,
+                        help="The number of tables to spread the keys across")
+
+    parser.add_argument("-r", "--rate", default=50, type=float,
+                        help="How many times per second every key is updated")
+
+    parser.add_argument("-d", "--duration", default=10, type=float,
+                        help="How long to animate for at each key count (seconds)")
+
+    parser.add_argument("--client", type=str, default=None,
+                        help=argparse.SUPPRESS) # (used internally)
+
+    parser.add_argument("plotter_args", type=str, nargs="*",
+                        help="Extra lime-plotter arguments (after a --), eg --listen")
+
+    return parser.parse_args()
+
+def write_plots(filename, tables, keys):
+    """Plots every generated key against localtime, one plot per table"""
+    plots = {}
+    for table in range(tables):
+        plots[f"generated_{table}"] = [{
+            'x': 'localtime',
+            'y': ['tick', 'sent_time'] + [f"key_{key}" for key in range(keys)],
+            'table': f"generated_{table}",
+        }]
+    with open(filename, "w") as fh:
+        yaml.dump({'plots': plots}, fh)
+
+def run_client(plots, duration, plotter_args):
+    """Animates the plots (in this process) and prints the results"""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import frc1678.limeplotter.main as lime_plotter
+
+    sys.argv = ["lime-plotter", "-a", "-N", "127.0.0.1", "-y", plots,
+                "--ll", "error"] + plotter_args
+    lime_plotter.main()
+
+    frames = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        lime_plotter.update_animate(frames)
+        plt.gcf().canvas.draw()
+        frames += 1
+    elapsed = time.perf_counter() - start
+
+    # the tick and sent_time columns tell us what was missed, and when
+    # each captured update was sent
+    source = lime_plotter.default_data_source
+    latencies = []
+    captured = 0
+    expected = 0
+    for plot_entry in lime_plotter.plot_info:
+        data = lime_plotter.entry_data(plot_entry)
+        if data is None or len(data.index) == 0:
+            continue
+        data = data.dropna(subset=['tick', 'sent_time'])
+        ticks = data['tick'].to_numpy()
+        if len(ticks) == 0:
+            continue
+        captured += len(np.unique(ticks))
+        expected += int(ticks.max() - ticks.min()) + 1
+
+        # only the first row holding each tick shows when it arrived
+        (unique, first) = np.unique(ticks, return_index=True)
+        arrived = source.start_time + data['localtime'].to_numpy()[first]
+        latencies.extend(arrived - data['sent_time'].to_numpy()[first])
+
+    print(json.dumps({'fps': frames / elapsed,
+                      'latency': float(np.mean(latencies)) if latencies else None,
+                      'latency_95': float(np.percentile(latencies, 95)) if latencies else None,
+                      'dropped': 1 - captured / expected if expected else None}))
+
+def time_keys(args, keys, directory):
+    keys_per_table = max(1, keys // args.tables)
+    plots = os.path.join(directory, f"plots-{keys}.yml")
+    write_plots(plots, args.tables, keys_per_table)
+
+    server = subprocess.Popen([sys.executable, "-m",
+                               "frc1678.limeplotter.networktablesserver",
+                               "-G", str(args.tables), str(keys_per_table),
+                               "--rate", str(args.rate),
+                               "--ll", "error"])
+    try:
+        time.sleep(1) # let it start publishing
+        client = subprocess.run([sys.executable, __file__,
+                                 "--client", plots,
+                                 "-d", str(args.duration), "--"]
+                                + args.plotter_args,
+                                capture_output=True, text=True, check=True)
+    finally:
+        server.terminate()
+        server.wait()
+    return json.loads(client.stdout.strip().splitlines()[-1])
+
+def format_result(value, scale = 1, format = "{:9.1f}"):
+    if value is None:
+        return f"{'-':>9}"
+    return format.format(value * scale)
+
+def main():
+    args = parse_args()
+    if args.client:
+        run_client(args.client, args.duration, args.plotter_args)
+        return
+
+    print(" keys   frames/s  latency(ms)  95%(ms)  dropped(%)")
+    with tempfile.TemporaryDirectory() as directory:
+        for keys in args.key_counts:
+            result = time_keys(args, keys, directory)
+            print(f"{keys:5d}  " + "  ".join([
+                format_result(result['fps']),
+                format_result(result['latency'], 1000),
+                format_result(result['latency_95'], 1000, "{:7.1f}"),
+                format_result(result['dropped'], 100)]))
+
+if __name__ == "__main__":
+    main()
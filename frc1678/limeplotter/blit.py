@@ -0,0 +1,82 @@
+"""Animation by blitting: only the animated artists are redrawn each frame,
+on top of a saved copy of everything else in the figure"""
+
+from logging import debug
+
+# how much extra room (as a fraction of the data's range) to leave when
+# the axis limits have to grow, so they don't need to grow every frame
+LIMIT_GROWTH = .25
+
+def grow_limits(current, wanted, growth = LIMIT_GROWTH):
+    """Returns new (low, high) limits covering both the current limits
+    (if there are any yet) and the wanted ones, with some room to
+    spare, or None if the current limits already cover the wanted
+    ones."""
+    if current is None:
+        (new_low, new_high) = wanted
+    elif wanted[0] >= current[0] and wanted[1] <= current[1]:
+        return None
+    else:
+        new_low = min(current[0], wanted[0])
+        new_high = max(current[1], wanted[1])
+
+    room = (new_high - new_low) * growth
+    if room == 0:
+        room = abs(new_high) * growth or 1.0 # a single point
+    if current is None or wanted[0] < current[0]:
+        new_low -= room
+    if current is None or wanted[1] > current[1]:
+        new_high += room
+    return (new_low, new_high)
+
+class BlitAnimation():
+    """Calls 'update' every 'interval' milliseconds and redraws just the
+    artists in 'artists' (which are marked as animated so the rest of
+    the figure can be drawn once and saved as the background).
+
+    'update' returns True when the whole figure needs to be redrawn,
+    eg because the axis limits changed.  Like FuncAnimation, the
+    timer is available as event_source for pausing.
+    """
+
+    def __init__(self, fig, update, artists, interval = 200):
+        self._fig = fig
+        self._canvas = fig.canvas
+        self._update = update
+        self._artists = artists
+        self._background = None
+        self._frame = 0
+        for artist in artists:
+            artist.set_animated(True)
+
+        self._canvas.mpl_connect("draw_event", self.on_draw)
+        self.event_source = self._canvas.new_timer(interval=interval)
+        self.event_source.add_callback(self.step)
+        self.event_source.start()
+
+    def on_draw(self, event):
+        """Saves the newly drawn figure (sans animated artists) as the
+        background and then draws the animated artists over it."""
+        self._background = self._canvas.copy_from_bbox(self._fig.bbox)
+        self.draw_artists()
+
+    def draw_artists(self):
+        for artist in self._artists:
+            self._fig.draw_artist(artist)
+
+    def redraw(self):
+        """Redraws the whole figure (eg, after its static parts change)"""
+        debug("blit: redrawing the background")
+        self._canvas.draw_idle()
+
+    def step(self):
+        redraw = self._update(self._frame)
+        self._frame += 1
+        if redraw or self._background is None:
+            self.redraw()
+            return
+
+        self._canvas.restore_region(self._background)
+        self.draw_artists()
+        self._canvas.blit(self._fig.bbox)
+        self._canvas.flush_events()
@@ -0,0 +1,214 @@
+"""Reduces the number of points in a line to about what can actually be
+seen on the screen"""
+
+import numpy as np
+
+DECIMATION_METHODS = ["minmax", "lttb", "none"]
+
+def pixel_decimate(x, y, transform):
+    """Returns the x and y arrays without the points that would be drawn
+    on the same pixel as the point before them, where 'transform' maps
+    the data to display (pixel) coordinates.  The first and last points
+    and any missing (NaN) points, which break up the line, are kept."""
+    if len(x) < 3:
+        return (x, y)
+    pixels = np.floor(transform.transform(np.column_stack([x, y])))
+    keep = np.empty(len(pixels), dtype=bool)
+    keep[0] = keep[-1] = True
+    # (NaN never equals anything so missing points are always kept)
+    keep[1:-1] = (pixels[1:-1] != pixels[:-2]).any(axis=1)
+    return (x[keep], y[keep])
+
+def unique_pixels(x, y, transform):
+    """Returns the indexes of the first point drawn on each pixel, for
+    points drawn as separate markers"""
+    pixels = np.floor(transform.transform(np.column_stack([x, y])))
+    (unique, first) = np.unique(pixels, axis=0, return_index=True)
+    return np.sort(first)
+
+def horizontal_pixels(transform, x, y):
+    """Returns the horizontal display position of each point"""
+    if transform.is_affine:
+        # just the x part of the transform, which usually ignores y
+        matrix = transform.get_matrix()
+        if matrix[0, 1] == 0:
+            return matrix[0, 0] * x + matrix[0, 2]
+        return matrix[0, 0] * x + matrix[0, 1] * y + matrix[0, 2]
+    return transform.transform(np.column_stack([x, y]))[:, 0]
+
+def first_in_buckets(mask, buckets):
+    """Returns the index of the first True in mask within each bucket
+    (where buckets is the non-decreasing bucket number of each index)"""
+    indexes = np.flatnonzero(mask)
+    if len(indexes) == 0:
+        return indexes
+    starts = np.empty(len(indexes), dtype=bool)
+    starts[0] = True
+    starts[1:] = buckets[indexes[1:]] != buckets[indexes[:-1]]
+    return indexes[starts]
+
+def minmax_indexes(y, columns):
+    """Returns the indexes of the first, last, minimum and maximum point
+    in each pixel column (given as a non-decreasing number for each
+    point), which draw exactly the same line as all of the points.  The
+    first missing (NaN) point in a column is kept too, to keep any
+    break in the line."""
+    n = len(y)
+    starts = np.flatnonzero(np.diff(columns, prepend=columns[0] - 1))
+    counts = np.diff(np.append(starts, n))
+    buckets = np.repeat(np.arange(len(starts)), counts)
+
+    keep = [starts, starts + counts - 1]
+    if y.dtype.kind in 'f':
+        missing = np.isnan(y)
+        if missing.any():
+            keep.append(first_in_buckets(missing, buckets))
+    with np.errstate(invalid='ignore'): # (buckets of nothing but NaN)
+        for reduce in (np.fmin, np.fmax):
+            extremes = np.repeat(reduce.reduceat(y, starts), counts)
+            keep.append(first_in_buckets(y == extremes, buckets))
+    return np.unique(np.concatenate(keep))
+
+def lttb_indexes(x, y, threshold):
+    """Returns the indexes of 'threshold' points chosen by the Largest
+    Triangle Three Buckets algorithm: the points are split into
+    buckets, and from each bucket the point making the largest
+    triangle with the point chosen from the previous bucket and the
+    average of the next bucket is kept."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = x.astype(float)
+    y = y.astype(float)
+    # the first and last points are kept, with the rest split evenly
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+    chosen = 0
+    for bucket in range(threshold - 2):
+        (start, end) = (edges[bucket], edges[bucket + 1])
+        if bucket + 2 < len(edges):
+            next_x = x[end:edges[bucket + 2]].mean()
+            next_y = y[end:edges[bucket + 2]].mean()
+        else:
+            (next_x, next_y) = (x[-1], y[-1])
+
+        areas = np.abs((x[chosen] - next_x) * (y[start:end] - y[chosen])
+                       - (x[chosen] - x[start:end]) * (next_y - y[chosen]))
+        # (a missing point wins only if they're all missing, keeping a break)
+        areas[np.isnan(areas)] = -1
+        chosen = start + int(np.argmax(areas))
+        keep[bucket + 1] = chosen
+    return keep
+
+class Decimator():
+    """Keeps the full resolution data of lines and scatter plots, but
+    hands them just enough of it to look the same at the size they're
+    being drawn, redoing it whenever their axis is zoomed, panned or
+    resized.
+
+    Lines whose x values increase from left to right (like anything
+    plotted against time) keep the first, last, minimum and maximum
+    point in each pixel column ('minmax', so every peak is kept) or
+    one point per pixel column picked by Largest Triangle Three
+    Buckets ('lttb'), from the points in view.  Other lines (eg, x/y
+    positions) drop points that land on the same pixel as the one
+    before them, and markers only keep one point per pixel.
+    """
+
+    def __init__(self, method = "minmax"):
+        self._method = method
+        self._data = {} # artist -> full resolution (x, y)
+        self._watched = set()
+        self._canvases = set()
+        self._redoing = set()
+
+    def keep(self, artist, x, y):
+        """Keeps the full data of a line or scatter plot that's already
+        been drawn with all of it, to be decimated by redo_all (eg, once
+        the figure's size is known)"""
+        if self._method == "none":
+            return
+        self._data[artist] = (x, y)
+        self.watch(artist.axes)
+
+    def set_data(self, line, x, y):
+        """Sets a line's data, drawing as little of it as needed"""
+        if self._method == "none":
+            line.set_data(x, y)
+            return
+        self.keep(line, x, y)
+        line.set_data(*self.decimate_line(line, x, y))
+
+    def watch(self, axis):
+        if axis in self._watched:
+            return
+        self._watched.add(axis)
+        axis.callbacks.connect('xlim_changed', self.redo)
+        axis.callbacks.connect('ylim_changed', self.redo)
+        canvas = axis.figure.canvas
+        if canvas not in self._canvases:
+            self._canvases.add(canvas)
+            canvas.mpl_connect('resize_event', self.redo_all)
+
+    def redo(self, axis):
+        """Decimates the full data of everything in axis again"""
+        if axis in self._redoing:
+            return
+        self._redoing.add(axis)
+        try:
+            # (reading the view limits applies any pending autoscaling,
+            # which would otherwise call us again part way through)
+            axis.viewLim
+            for (artist, (x, y)) in self._data.items():
+                if artist.axes is not axis:
+                    continue
+                if hasattr(artist, 'set_offsets'):
+                    self.decimate_collection(artist, x, y)
+                else:
+                    artist.set_data(*self.decimate_line(artist, x, y))
+        finally:
+            self._redoing.discard(axis)
+
+    def redo_all(self, event = None):
+        for axis in self._watched:
+            self.redo(axis)
+
+    def decimate_collection(self, collection, x, y):
+        keep = np.arange(len(x))
+        if len(x) > 0 and x.dtype.kind in 'biuf' and y.dtype.kind in 'biuf':
+            keep = unique_pixels(x, y, collection.get_offset_transform())
+        collection.set_offsets(np.column_stack([x[keep], y[keep]]))
+
+    def decimate_line(self, line, x, y):
+        """Returns the x and y to draw for line from its full data"""
+        if len(x) < 3 or x.dtype.kind not in 'biuf' or y.dtype.kind not in 'biuf':
+            return (x, y)
+        # (reading the view limits applies any pending autoscaling)
+        line.axes.viewLim
+        transform = line.get_transform()
+        if line.get_linestyle() in ('None', '', ' '):
+            keep = unique_pixels(x, y, transform)
+            return (x[keep], y[keep])
+
+        columns = horizontal_pixels(transform, x, y)
+        steps = np.diff(columns)
+        if not (steps >= 0).all():
+            # not left to right (or missing some x values)
+            return pixel_decimate(x, y, transform)
+
+        # only the points in view (and one either side) are needed
+        bbox = line.axes.bbox
+        first = max(int(np.searchsorted(columns, bbox.x0)) - 1, 0)
+        end = int(np.searchsorted(columns, bbox.x1, side='right')) + 1
+        (x, y, columns) = (x[first:end], y[first:end], columns[first:end])
+        if len(x) < 3:
+            return (x, y)
+
+        if self._method == "lttb":
+            keep = lttb_indexes(x, y, max(int(bbox.width), 3))
+        else:
+            keep = minmax_indexes(y, np.floor(columns).astype(np.int64))
+        return (x[keep], y[keep])
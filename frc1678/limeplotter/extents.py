@@ -0,0 +1,91 @@
+"""Running (min, max) extents of a column that only ever grows at the end
+and shrinks from the front, updated from just the rows that changed"""
+
+from collections import deque
+
+import numpy as np
+
+class RunningExtents():
+    """Tracks the (min, max) of the values in a column, optionally only
+    over its last 'window' rows.
+
+    The candidates for the minimum (and maximum) are kept in monotonic
+    deques of (row, value): a value can never be the minimum again once
+    a smaller (or equal) value arrives after it, so it's dropped from
+    the back, and values that slide out of the window (or are dropped
+    from the front of the data) expire from the front.  Each row is
+    added and removed at most once, so keeping the extents costs time
+    in proportion to the rows added or dropped, not the rows held.
+    """
+
+    def __init__(self, window = None):
+        self._window = window
+        self._rows = 0   # how many rows have ever been added
+        self._first = 0  # the first row still held
+        self._minimums = deque()
+        self._maximums = deque()
+
+    def clear(self):
+        self._first = self._rows
+        self._minimums.clear()
+        self._maximums.clear()
+
+    @property
+    def extents(self):
+        """The (min, max) of the values in the window, or None if there
+        aren't any (non-NaN) values in it"""
+        if not self._minimums:
+            return None
+        return (self._minimums[0][1], self._maximums[0][1])
+
+    def extend(self, values):
+        """Adds the values of newly arrived rows to the end"""
+        first_row = self._rows
+        self._rows += len(values)
+        if self._window and len(values) > self._window:
+            # the earlier ones would slide straight out of the window
+            first_row = self._rows - self._window
+            values = values[-self._window:]
+
+        if values.dtype.kind in 'f':
+            rows = np.flatnonzero(~np.isnan(values))
+            values = values[rows]
+        else:
+            rows = np.arange(len(values))
+        rows += first_row
+
+        if len(values) > 0:
+            add_candidates(self._minimums, rows, values, np.minimum, np.less)
+            add_candidates(self._maximums, rows, values, np.maximum, np.greater)
+        self.expire()
+
+    def drop(self, rows):
+        """Forgets the values of the oldest 'rows' rows"""
+        self._first = min(self._first + rows, self._rows)
+        self.expire()
+
+    def expire(self):
+        first = self._first
+        if self._window:
+            first = max(first, self._rows - self._window)
+        for candidates in (self._minimums, self._maximums):
+            while candidates and candidates[0][0] < first:
+                candidates.popleft()
+
+def add_candidates(candidates, rows, values, best, better):
+    """Adds new values to a monotonic deque of candidates, where 'best'
+    is np.minimum or np.maximum and 'better' is np.less or np.greater.
+
+    Only values that are better than every value after them in the new
+    batch can become the extent later on, and they're found all at once
+    by accumulating the best value from the end of the batch.
+    """
+    best_after = best.accumulate(values[::-1])[::-1]
+    keep = np.ones(len(values), dtype=bool)
+    keep[:-1] = better(values[:-1], best_after[1:])
+
+    # older candidates that are no better than the batch's best are done
+    batch_best = best_after[0]
+    while candidates and not better(candidates[-1][1], batch_best):
+        candidates.pop()
+    candidates.extend(zip(rows[keep].tolist(), values[keep].tolist()))
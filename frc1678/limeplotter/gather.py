@@ -0,0 +1,146 @@
+"""Gathers the newly arrived rows for the plot entries, fetching each table
+of each data source just once per frame no matter how many entries plot
+columns from it"""
+
+import pandas as pd
+
+from frc1678.limeplotter.loader.buffer import TableBuffer
+from frc1678.limeplotter.extents import RunningExtents
+
+class TableGather():
+    """Gathers the new rows of every column that a set of plot entries
+    needs from one table of a data source (or just one entry's columns,
+    when they can't be shared, such as columns joined from several
+    tables).
+
+    Each entry is handed the same views of the columns the data source
+    holds (as entry['columns']) along with running extents of its
+    numeric columns over its 'last' window (as entry['extents']);
+    entries with the same column and window share the same extents.
+    Sources that can't hand out views of what they hold (such as timer
+    marks) have their rows kept in a TableBuffer instead, starting over
+    when the source's generation changes and dropping rows the source
+    no longer holds.
+    """
+
+    def __init__(self, source, entries):
+        self.source = source
+        self.entries = entries
+        idents = []
+        for entry in entries:
+            for ident in [entry['xident']] + list(entry['yidents']):
+                if list(ident) not in idents:
+                    idents.append(list(ident))
+        self._xident = idents[0]
+        self._yidents = idents[1:]
+        self.reset()
+
+    def reset(self):
+        """Starts over from whatever the source holds on the next gather"""
+        self._cursor = None
+        self._columns = None
+        self._held = 0
+        self._buffer = None
+        self._extents = {}
+
+    def gather(self, animate):
+        """Gathers the rows the source holds, returning how many of them
+        are new"""
+        held = self.source.gather_held(self._xident, self._yidents,
+                                       self._cursor, animate)
+        if held is None:
+            held = self.buffer_new_rows(animate)
+            if held is None:
+                return 0
+        (rows, new, cursor) = held
+
+        old_cursor = self._cursor
+        self._cursor = cursor
+        columns = list(rows.columns)
+        views = {column: rows[column].to_numpy() for column in columns}
+        length = len(rows.index)
+
+        replaced = (old_cursor is None or old_cursor[0] != cursor[0]
+                    or columns != self._columns)
+        if replaced:
+            self._columns = columns
+            self._held = 0
+            self._extents = {}
+            for entry in self.entries:
+                self.share_extents(entry, views)
+
+        # the rows held before, plus the new ones, less the ones still held
+        added = length if replaced else new
+        dropped = self._held + added - length
+        self._held = length
+        for ((column, window), extents) in self._extents.items():
+            extents.extend(views[column][length - added:])
+            if dropped > 0:
+                extents.drop(dropped)
+
+        for entry in self.entries:
+            entry['columns'] = views
+        return new
+
+    def buffer_new_rows(self, animate):
+        """Keeps our own copy of the rows, for sources that can't hand out
+        views of the ones they hold, returning the same as gather_held"""
+        (new_data, cursor) = self.source.gather_since(self._xident,
+                                                      self._yidents,
+                                                      self._cursor,
+                                                      animate)
+        if new_data is None:
+            return None
+
+        columns = list(new_data.columns)
+        values = {column: new_data[column].to_numpy() for column in columns}
+        buffer = self._buffer
+        if (buffer is None or self._cursor is None
+            or self._cursor[0] != cursor[0] or buffer.columns != columns):
+            buffer = TableBuffer()
+            for column in columns:
+                buffer.add_column(column, values[column].dtype)
+            self._buffer = buffer
+        buffer.extend(values)
+
+        dropped = len(buffer) - (cursor[2] - cursor[1])
+        if dropped > 0:
+            buffer.drop(dropped)
+
+        rows = pd.DataFrame({column: buffer.view(column) for column in columns},
+                            columns=columns, copy=False)
+        return (rows, len(new_data.index), cursor)
+
+    def share_extents(self, entry, values):
+        window = entry['options'].get('last')
+        window = window and int(window)
+        entry['extents'] = {}
+        for column in entry_columns(entry):
+            if column not in values or values[column].dtype.kind not in 'biuf':
+                continue
+            key = (column, window)
+            if key not in self._extents:
+                self._extents[key] = RunningExtents(window)
+            entry['extents'][column] = self._extents[key]
+
+def entry_columns(entry):
+    """The names of the columns a plot entry uses, x first"""
+    idents = [entry['xident']] + list(entry['yidents'])
+    return list(dict.fromkeys([ident[1] for ident in idents]))
+
+def group_entries(plot_entries):
+    """Returns a TableGather for each table (of each data source) that
+    the plot entries use"""
+    groups = {}
+    for entry in plot_entries:
+        source = entry['data_source']
+        tables = set([ident[0] for ident in
+                      [entry['xident']] + list(entry['yidents'])])
+        if len(tables) == 1 and source.can_share_gathers():
+            key = (id(source), tables.pop())
+        else:
+            key = id(entry) # a group of its own
+        groups.setdefault(key, []).append(entry)
+
+    return [TableGather(entries[0]['data_source'], entries)
+            for entries in groups.values()]
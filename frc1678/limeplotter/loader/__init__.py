@@ -1,5 +1,7 @@
 """An entirely virtual LoaderBase class needed just for documentation"""
 
+from logging import warning
+
 class LoaderBase():
     """An (almost) virtual class just to document the required functions
     that must be overridden by child classes to be functional.
@@ -24,6 +26,12 @@ class LoaderBase():
         data from a datasource."""
         pass
 
+    def require_columns(self, xident, yidents):
+        """Called once the plot specification has been resolved into
+        identifiers, so sources that load data lazily can read just
+        the columns that will actually be plotted."""
+        pass
+
     def gather(self, xident, yident, animate = False):
         """This function should return a pandas DataFrame object containing
         two columns identified by the xident and yident identifiers.
@@ -32,6 +40,61 @@ class LoaderBase():
         """
         pass
 
+    def can_share_gathers(self):
+        """Whether plot entries using columns from the same table can all
+        be handed the columns from one gather_held (or gather_since)
+        call for all of their columns (ie, the rows returned don't
+        depend on which columns are asked for)."""
+        return False
+
+    def gather_held(self, xident, yidents, cursor = None, animate = True):
+        """Like gather_since, but returns every row the source still holds
+        as views of its own storage (not copies), along with how many
+        of them (at the end) are new: (rows, new, cursor).
+
+        Sources that can't hand out views of what they hold return None,
+        and callers keep their own copies of the rows from gather_since
+        instead."""
+        return None
+
+    def gather_since(self, xident, yidents, cursor = None, animate = True):
+        """Like gather, but returns only the rows that are new since the
+        call that returned 'cursor', along with the cursor to pass in
+        next time.  Cursors are (generation, first, end) tuples, where
+        first and end count rows since the data was last cleared and
+        first is the oldest row the source still holds.  When the
+        generation changes, the returned rows replace everything
+        returned before.
+
+        This default can't tell which rows are new, so it returns
+        everything as a new generation every time."""
+        df = self.gather(xident, yidents, animate)
+        if df is None:
+            return (None, cursor)
+        self.new_generation()
+        return self.rows_since(df, 0, None)
+
+    def new_generation(self):
+        """Called when the gathered data is cleared or replaced"""
+        self._generation = getattr(self, '_generation', 0) + 1
+
+    def held_since(self, df, first, cursor):
+        """Returns df, how many of its rows are newer than cursor and the
+        new cursor.  'first' is the position of df's first row (see
+        gather_since)."""
+        generation = getattr(self, '_generation', 0)
+        end = first + len(df.index)
+        done = first
+        if cursor and cursor[0] == generation:
+            done = min(max(cursor[2], first), end)
+        return (df, end - done, (generation, first, end))
+
+    def rows_since(self, df, first, cursor):
+        """Returns the rows of df that are newer than cursor, along with
+        the new cursor (see held_since)."""
+        (df, new, cursor) = self.held_since(df, first, cursor)
+        return (df.iloc[len(df.index) - new:], cursor)
+
     def clear_data(self):
         """This is called to reset a graph during animations; it should clear
         out all past stored data."""
@@ -40,22 +103,54 @@ class LoaderBase():
     def get_default_time_column(self):
         return 'timestamp'
 
-    def find_column_identifier(self, column_name, table_info):
-        "Finds an column name in a nested structure of table/column_names "
-        for table in table_info:
-            if column_name in table_info[table]:
-                return [table, column_name]
+    def index_table(self, table, columns):
+        """Adds a table's columns to the column name -> [tables] index used
+        for finding columns; loaders call this as tables appear."""
+        index = getattr(self, '_column_index', None)
+        if index is None:
+            index = {}
+            self._column_index = index
+
+        for column in columns:
+            tables = index.setdefault(column, [])
+            if table not in tables:
+                tables.append(table)
+
+    def clear_index(self):
+        self._column_index = {}
+
+    def find_column_table(self, column_name):
+        """Returns the table holding column_name, complaining (once) when
+        more than one table contains a column with that name."""
+        tables = getattr(self, '_column_index', {}).get(column_name)
+        if not tables:
+            return None
 
-    def find_column_timestamp_identifier(self, column_name, table_info,
+        if len(tables) > 1:
+            reported = getattr(self, '_reported_duplicates', None)
+            if reported is None:
+                reported = set()
+                self._reported_duplicates = reported
+            if column_name not in reported:
+                reported.add(column_name)
+                warning(f"'{column_name}' is in multiple tables ({', '.join(tables)}); using {tables[0]}")
+
+        return tables[0]
+
+    def find_column_identifier(self, column_name):
+        "Finds an column name in the indexed tables"
+        table = self.find_column_table(column_name)
+        if table is not None:
+            return [table, column_name]
+
+    def find_column_timestamp_identifier(self, column_name,
                                          matching = 'timestamp'):
         """Same, but looks for a column 'matching' for a table identified by a
         different column_name ; useful for looking for duplicate
         'matching' named columns (eg, timestamps) that exist in every
         table.
         """
-        for table in table_info:
-            if column_name in table_info[table]:
-                # XXX todo:: make sure matching exists before returning it
-                return [table, matching]
-
-
+        table = self.find_column_table(column_name)
+        if table is not None:
+            # XXX todo:: make sure matching exists before returning it
+            return [table, matching]
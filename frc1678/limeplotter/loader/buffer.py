@@ -0,0 +1,150 @@
+"""NumPy based column storage for data that arrives a row at a time"""
+
+import numpy as np
+
+def empty_column(capacity, dtype):
+    """Returns a new column of 'capacity' missing values (NaN where the
+    type allows it, otherwise zeros)"""
+    dtype = np.dtype(dtype)
+    if dtype.kind in 'fcO':
+        return np.full(capacity, np.nan, dtype=dtype)
+    return np.zeros(capacity, dtype=dtype)
+
+class TableBuffer():
+    """Stores a table's columns in preallocated NumPy arrays, along with
+    the time each row arrived.
+
+    Rows are always kept contiguous so views of any column can be
+    handed out without copying.  New rows are only ever written past
+    the end of the current rows, and when the arrays fill up the held
+    rows are moved into newly allocated arrays, so views handed out
+    earlier stay valid.  Old rows are dropped from the front once more
+    than max_rows rows or max_seconds of data are being held; without
+    either limit the arrays grow as needed.
+    """
+
+    def __init__(self, capacity = 1024, max_rows = None, max_seconds = None):
+        self._max_rows = max_rows
+        self._max_seconds = max_seconds
+        self._capacity = capacity
+        if max_rows:
+            # twice the retained rows means we only move them rarely
+            self._capacity = 2 * max_rows
+        self._dtypes = {}
+        self._start = 0
+        self._end = 0
+        self._dropped = 0
+        self.clear()
+
+    def __len__(self):
+        return self._end - self._start
+
+    def __contains__(self, column):
+        return column in self._arrays
+
+    @property
+    def columns(self):
+        return list(self._arrays.keys())
+
+    @property
+    def dropped(self):
+        """The number of rows that have been dropped from the front"""
+        return self._dropped
+
+    def dtype(self, column):
+        return self._arrays[column].dtype
+
+    def add_column(self, column, dtype = np.float64):
+        """Adds a column, filling in NaN for any rows we already have"""
+        if column in self._arrays:
+            return
+        self._dtypes[column] = dtype
+        self._arrays[column] = empty_column(self._capacity, dtype)
+
+    def make_room(self, rows):
+        if self._end + rows <= self._capacity:
+            return
+
+        length = len(self)
+        capacity = self._capacity
+        while length + rows > capacity // 2 and not self._max_rows:
+            capacity *= 2
+        capacity = max(capacity, length + rows)
+
+        # copy into new arrays rather than moving rows in place, so any
+        # views of the old arrays still show what they did
+        for name in self._arrays:
+            array = empty_column(capacity, self._dtypes[name])
+            array[:length] = self._arrays[name][self._start:self._end]
+            self._arrays[name] = array
+        times = np.empty(capacity)
+        times[:length] = self._times[self._start:self._end]
+        self._times = times
+
+        self._capacity = capacity
+        self._start = 0
+        self._end = length
+
+    def append(self, values, when):
+        """Adds a row of values (a dictionary of column -> value) that
+        arrived at time 'when'.  Missing columns are stored as NaN."""
+        self.make_room(1)
+        for name in self._arrays:
+            if name in values:
+                self._arrays[name][self._end] = values[name]
+        self._times[self._end] = when
+        self._end += 1
+        self.trim()
+
+    def extend(self, values, when = None):
+        """Adds several rows at once.  'values' is a dictionary of column
+        -> array of values, which must all be the same length, and
+        'when' is an array of the times they arrived (if known)."""
+        rows = len(next(iter(values.values()), []))
+        if rows == 0:
+            return
+        self.make_room(rows)
+        end = self._end + rows
+        for name in self._arrays:
+            if name in values:
+                self._arrays[name][self._end:end] = values[name]
+        self._times[self._end:end] = np.nan if when is None else when
+        self._end = end
+        self.trim()
+
+    def drop(self, rows):
+        """Drops the oldest 'rows' rows"""
+        rows = min(rows, len(self))
+        self._dropped += rows
+        self._start += rows
+
+    def trim(self):
+        """Drops rows from the front that are beyond the retention limits"""
+        start = self._start
+        if self._max_rows and len(self) > self._max_rows:
+            start = self._end - self._max_rows
+        if self._max_seconds and len(self) > 0:
+            times = self._times[start:self._end]
+            start += int(np.searchsorted(times, times[-1] - self._max_seconds,
+                                         side='left'))
+        self._dropped += start - self._start
+        self._start = start
+
+    def view(self, column):
+        """Returns a (read-only) view of a column's values"""
+        view = self._arrays[column][self._start:self._end]
+        view.flags.writeable = False
+        return view
+
+    def times(self):
+        """Returns a view of the times each row arrived"""
+        return self._times[self._start:self._end]
+
+    def clear(self):
+        """Forgets all the rows (but not the columns)"""
+        self._dropped += len(self)
+        self._arrays = {name: empty_column(self._capacity, dtype)
+                        for (name, dtype) in self._dtypes.items()}
+        self._times = np.empty(self._capacity)
+        self._start = 0
+        self._end = 0
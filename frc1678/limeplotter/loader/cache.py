@@ -0,0 +1,235 @@
+"""A persistent on-disk cache of parsed log file columns"""
+
+import hashlib
+import json
+import os
+import os.path
+import shutil
+
+from logging import debug
+
+import numpy as np
+import pandas as pd
+
+from frc1678.limeplotter.loader.log import open_log, LOCALTIME_DELTA
+
+DEFAULT_CACHE_DIRECTORY = os.path.join(os.path.expanduser("~"),
+                                       ".cache", "lime-plotter")
+DEFAULT_CACHE_SIZE = 1024 # MB
+
+INFO_FILE = "info.json"
+
+def count_rows(path, block_size = 1024 * 1024):
+    """Counts the data rows in a (possibly compressed) CSV file without
+    parsing it"""
+    lines = 0
+    last = b"\n"
+    with open_log(path) as fh:
+        while True:
+            block = fh.read(block_size)
+            if not block:
+                break
+            lines += block.count(b"\n")
+            last = block[-1:]
+    if last != b"\n":
+        lines += 1 # an unterminated final line
+    return lines - 1 # minus the header
+
+class ColumnCache():
+    """Stores every parsed column of a log file as its own .npy file
+    inside a per-log directory.  Entries are keyed by the log's path
+    and are thrown away when its size or modification time changes.
+    The least recently used entries are evicted when the cache grows
+    beyond max_size megabytes.
+    """
+
+    def __init__(self, directory = None, max_size = DEFAULT_CACHE_SIZE):
+        self._directory = directory or DEFAULT_CACHE_DIRECTORY
+        self._max_bytes = max_size * 1024 * 1024
+
+    @property
+    def directory(self):
+        return self._directory
+
+    def entry_directory(self, path):
+        key = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+        return os.path.join(self._directory, key)
+
+    def column_file(self, path, column):
+        # column names may contain anything, so name files by their hash
+        key = hashlib.sha1(column.encode()).hexdigest()
+        return os.path.join(self.entry_directory(path), key + ".npy")
+
+    def signature(self, path):
+        stat = os.stat(path)
+        return {'path': os.path.abspath(path),
+                'size': stat.st_size,
+                'mtime': stat.st_mtime_ns}
+
+    def read_info(self, path):
+        try:
+            with open(os.path.join(self.entry_directory(path), INFO_FILE)) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def write_info(self, path, info):
+        with open(os.path.join(self.entry_directory(path), INFO_FILE), "w") as fh:
+            json.dump(info, fh)
+
+    def lookup(self, path):
+        """Returns the cached information about a log file (its columns,
+        row count, and which columns are cached) if it's still valid."""
+        info = self.read_info(path)
+        if not info:
+            return None
+
+        if info['signature'] != self.signature(path):
+            debug(f"cache: {path} changed; discarding its cache")
+            shutil.rmtree(self.entry_directory(path), ignore_errors=True)
+            return None
+
+        # mark it as recently used
+        os.utime(os.path.join(self.entry_directory(path), INFO_FILE))
+        return info
+
+    def load(self, path, columns, mmap = False):
+        """Returns a dictionary of the requested columns that are present in
+        the cache for the log file 'path'.  With mmap, numeric columns
+        are returned as read-only memory maps of the cache files."""
+        info = self.lookup(path)
+        if not info:
+            return {}
+
+        results = {}
+        for column in columns:
+            if column in info['cached']:
+                results[column] = self.load_column(path, column, mmap)
+        return results
+
+    def load_column(self, path, column, mmap = False):
+        filename = self.column_file(path, column)
+        if mmap:
+            try:
+                return np.load(filename, mmap_mode='r')
+            except ValueError:
+                pass # python objects (eg, strings) can't be memory mapped
+        return np.load(filename, allow_pickle=True)
+
+    def store(self, path, columns, fake_localtime, data = {}):
+        """Saves the header information for a log file along with any
+        parsed columns passed in 'data'."""
+        info = self.lookup(path)
+        if not info:
+            os.makedirs(self.entry_directory(path), exist_ok=True)
+            info = {'signature': self.signature(path),
+                    'columns': columns,
+                    'fake_localtime': fake_localtime,
+                    'rows': None,
+                    'cached': []}
+
+        for column in data:
+            values = np.asarray(data[column])
+            np.save(self.column_file(path, column), values,
+                    allow_pickle=True)
+            info['rows'] = len(values)
+            if column not in info['cached']:
+                info['cached'].append(column)
+
+        self.write_info(path, info)
+        self.evict()
+
+    def convert(self, path, columns, fake_localtime, chunksize = 100000):
+        """Converts every column of a CSV log into the cache a chunk at a
+        time, so logs larger than memory can be memory mapped later.
+        Returns False if the file couldn't be converted this way."""
+        rows = count_rows(path)
+        directory = self.entry_directory(path)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+        arrays = {}
+        objects = {}
+        offset = 0
+        for chunk in pd.read_csv(path, chunksize=chunksize):
+            if offset + len(chunk.index) > rows:
+                break
+            for column in chunk.columns:
+                values = chunk[column].to_numpy()
+                if column not in arrays and column not in objects:
+                    if values.dtype.kind in 'biuf':
+                        arrays[column] = np.lib.format.open_memmap(
+                            self.column_file(path, column), mode='w+',
+                            dtype=np.float64, shape=(rows,))
+                    else:
+                        objects[column] = []
+
+                if column not in arrays:
+                    objects[column].append(values)
+                elif values.dtype.kind in 'biuf':
+                    arrays[column][offset:offset + len(values)] = values
+                else:
+                    # numbers (or nothing) at first, but not later on
+                    debug(f"cache: {column} in {path} isn't always numeric")
+                    offset = None
+                    break
+            if offset is None:
+                break
+            offset += len(chunk.index)
+
+        if offset != rows:
+            # blank lines, quoted newlines, etc: just parse it normally
+            debug(f"cache: unable to convert {path} in chunks")
+            arrays = None
+            shutil.rmtree(directory, ignore_errors=True)
+            return False
+
+        for column in arrays:
+            arrays[column].flush()
+        for column in objects:
+            np.save(self.column_file(path, column),
+                    np.concatenate(objects[column]), allow_pickle=True)
+        if fake_localtime:
+            np.save(self.column_file(path, 'localtime'),
+                    np.arange(rows) * LOCALTIME_DELTA)
+
+        self.write_info(path, {'signature': self.signature(path),
+                               'columns': columns,
+                               'fake_localtime': fake_localtime,
+                               'rows': rows,
+                               'cached': list(columns)})
+        self.evict()
+        return True
+
+    def entries(self):
+        """Returns a list of (last_used, size, directory) cache entries"""
+        results = []
+        if not os.path.isdir(self._directory):
+            return results
+
+        for name in os.listdir(self._directory):
+            directory = os.path.join(self._directory, name)
+            try:
+                last_used = os.stat(os.path.join(directory, INFO_FILE)).st_mtime
+                size = sum([os.stat(os.path.join(directory, filename)).st_size
+                            for filename in os.listdir(directory)])
+            except OSError:
+                continue
+            results.append((last_used, size, directory))
+        return results
+
+    def evict(self):
+        """Removes the least recently used entries until we fit in max_size"""
+        entries = sorted(self.entries())
+        total = sum([entry[1] for entry in entries])
+        # always keep the most recent entry, even if it's too big by itself
+        for (last_used, size, directory) in entries[:-1]:
+            if total <= self._max_bytes:
+                break
+            debug(f"cache: evicting {directory}")
+            shutil.rmtree(directory, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        """Removes everything from the cache"""
+        shutil.rmtree(self._directory, ignore_errors=True)
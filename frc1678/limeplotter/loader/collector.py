@@ -0,0 +1,80 @@
+"""A background thread that samples a data source at a fixed rate"""
+
+import threading
+import time
+from logging import debug, warning
+
+class Collector():
+    """Calls 'sample' rate times per second from its own thread, so data
+    collection doesn't slow down when drawing does.
+
+    A sample that starts more than half a period after it was scheduled
+    is counted as late.  When sampling falls more than a whole period
+    behind, the missed samples are skipped (and counted as dropped)
+    rather than taken in a burst.
+    """
+
+    def __init__(self, sample, rate = 50.0, report_interval = 10.0,
+                 name = "collector"):
+        self._sample = sample
+        self._period = 1.0 / rate
+        self._report_interval = report_interval
+        self._name = name
+        self._stop = threading.Event()
+        self._thread = None
+        self.samples = 0
+        self.late = 0
+        self.dropped = 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name=self._name,
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        return {'samples': self.samples,
+                'late': self.late,
+                'dropped': self.dropped}
+
+    def run(self):
+        next_time = time.monotonic()
+        next_report = next_time + self._report_interval
+        reported = (0, 0)
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if now - next_time > self._period / 2:
+                self.late += 1
+            self._sample()
+            self.samples += 1
+
+            next_time += self._period
+            now = time.monotonic()
+            if now > next_time:
+                missed = int((now - next_time) / self._period)
+                self.dropped += missed
+                next_time += missed * self._period
+
+            if now > next_report:
+                if (self.late, self.dropped) != reported:
+                    warning(f"{self._name}: {self.late} late and "
+                            f"{self.dropped} dropped of {self.samples} samples")
+                    reported = (self.late, self.dropped)
+                next_report = now + self._report_interval
+
+            self._stop.wait(max(0, next_time - time.monotonic()))
+
+        debug(f"{self._name}: stopped after {self.samples} samples "
+              f"({self.late} late, {self.dropped} dropped)")
@@ -0,0 +1,52 @@
+"""Helpers for storing loaded telemetry in smaller data types"""
+
+import numpy as np
+import pandas as pd
+
+# time columns need every bit of float64 precision to stay in order
+TIME_COLUMNS = ['timestamp', 'localtime']
+
+# string columns with fewer distinct values than this fraction of their
+# length are stored as categoricals
+CATEGORY_RATIO = .5
+
+def compact_series(series, appendable = False):
+    """Returns series converted to the smallest data type that holds its
+    values.  When more rows will be appended to it later (appendable),
+    only floats are shrunk since the other conversions depend on which
+    values have been seen so far."""
+    kind = series.dtype.kind
+    if kind == 'f':
+        values = series.to_numpy()
+        if (not appendable and len(values) > 0
+            and not np.isnan(values).any()):
+            if np.isin(values, [0, 1]).all():
+                return series.astype(bool)
+            if ((values == np.round(values)).all()
+                and np.abs(values).max() < 2**31):
+                return pd.to_numeric(series.astype(np.int64),
+                                     downcast='integer')
+        return series.astype(np.float32)
+
+    if appendable:
+        return series
+
+    if kind in 'iu':
+        if series.isin([0, 1]).all():
+            return series.astype(bool)
+        return pd.to_numeric(series, downcast='integer')
+
+    if kind in 'OU' or isinstance(series.dtype, pd.StringDtype):
+        if series.nunique() < len(series.index) * CATEGORY_RATIO:
+            return series.astype('category')
+
+    return series
+
+def compact_dataframe(df, appendable = False, keep = TIME_COLUMNS):
+    """Compacts every column of df (except those in keep) in place,
+    returning the number of bytes saved."""
+    before = df.memory_usage(deep=True).sum()
+    for column in df.columns:
+        if column not in keep:
+            df[column] = compact_series(df[column], appendable)
+    return int(before - df.memory_usage(deep=True).sum())
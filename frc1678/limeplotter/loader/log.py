@@ -1,16 +1,113 @@
+import io
 import sys
+import math
+import gzip
+import bz2
+import lzma
+import numpy as np
 import pandas as pd
 import os
 import os.path
 import time
 
+from logging import info, warning
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
 from frc1678.limeplotter.loader import LoaderBase
+from frc1678.limeplotter.loader.compact import compact_dataframe
+
+LOCALTIME_DELTA = .02 # should match real robot loop
+
+# compressed logs (eg, log.csv.gz) are decompressed while being parsed
+COMPRESSION_SUFFIXES = ['.gz', '.bz2', '.xz', '.zst']
+
+def is_log_file(filename):
+    """Whether a file name looks like a (possibly compressed) CSV log"""
+    return filename.endswith(tuple([".csv"] + [".csv" + suffix for suffix
+                                                in COMPRESSION_SUFFIXES]))
+
+def is_compressed(path):
+    return path.endswith(tuple(COMPRESSION_SUFFIXES))
+
+def open_log(path):
+    """Opens a log file for reading bytes, decompressing it on the fly"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    if path.endswith('.xz'):
+        return lzma.open(path, 'rb')
+    if path.endswith('.zst'):
+        import zstandard # optional; only needed for zstd compressed logs
+        return zstandard.open(path, 'rb')
+    return open(path, 'rb')
+
+# lime-record writes each table as a directory of numbered segment files
+SEGMENT_SUFFIX = '.npz'
+
+def is_segment_table(path):
+    """Whether a path is a directory of segments written by lime-record"""
+    return (os.path.isdir(path)
+            and any([filename.endswith(SEGMENT_SUFFIX)
+                     for filename in os.listdir(path)]))
+
+def read_segments(path):
+    """Reads all of a recorded table's segments into one dataframe.
+    Keys that started being published part way through are NaN in
+    the earlier segments."""
+    segments = []
+    for filename in sorted(os.listdir(path)):
+        if filename.endswith(SEGMENT_SUFFIX):
+            with np.load(os.path.join(path, filename)) as segment:
+                segments.append(pd.DataFrame({column: segment[column]
+                                              for column in segment.files}))
+    return pd.concat(segments, ignore_index=True, sort=False)
+
+def has_header(path):
+    """Whether a log file has a complete (newline terminated) first line"""
+    with open_log(path) as fh:
+        return fh.readline().endswith(b"\n")
+
+def read_log_file(path, lazy = False):
+    """Parses a CSV log file (or just its header row when lazy).  This
+    lives outside the LogLoader class so worker processes can call it."""
+    if lazy:
+        return pd.read_csv(path, nrows=0)
+    return pd.read_csv(path)
+
+def select_columns(df, columns, start = None, end = None):
+    """Returns rows start:end of df's columns as views of df's columns
+    (selecting a list of columns copies them, unless pandas is using
+    copy-on-write)"""
+    rows = df.iloc[start:end]
+    columns = list(dict.fromkeys(columns))
+    return pd.DataFrame({column: rows[column] for column in columns},
+                        columns=columns, copy=False)
 
 class LogLoader(LoaderBase):
     def __init__(self, directory = None, animation_frames=1,
-                 sources=None):
+                 sources=None, lazy=False, workers=1, cache=None,
+                 mmap=False, stream=False, stream_rows=0, time_range=None,
+                 follow=False, compact=False, join_tolerance=None):
         self._directory = directory
         self._sources = sources
+        # streaming and following only need the headers up front,
+        # just like lazy loading
+        self._lazy = lazy or stream or follow
+        self._stream = stream
+        self._follow = follow
+        self._stream_max_rows = stream_rows
+        self._time_range = time_range
+        self._workers = workers or os.cpu_count()
+        self._cache = cache
+        if follow:
+            self._cache = None # files being written can't be cached
+        self._mmap = mmap
+        # memory mapped columns are already not using any memory
+        self._compact = compact and not mmap
+        self._join_tolerance = join_tolerance
+        self._segment_tables = set()
         self.clear()
         self._slice_count = 0
         self._slice_increment = animation_frames
@@ -27,9 +124,9 @@ class LogLoader(LoaderBase):
         """Returns a list of tables/columns we found in the data source(s)."""
         self.open()
         outlist = {}
-        for filename in self._dataframes:
+        for filename in self._columns:
             outlist[filename] = {}
-            for column in self._dataframes[filename].columns:
+            for column in self._columns[filename]:
                 outlist[filename][column] = 1
         return outlist
 
@@ -42,19 +139,182 @@ class LogLoader(LoaderBase):
             return
         self._opened = True
         self.load_file_or_directories(self._sources)
+        if self._follow:
+            for path in self._csvs + self._waiting:
+                if is_compressed(path):
+                    raise ValueError(f"Compressed log files can't be followed: {path}")
+
+    def animate_only(self):
+        """Streamed and followed logs are only ever read a few rows at
+        a time."""
+        return self._stream or self._follow
+
+    def can_share_gathers(self):
+        return True
 
     def gather_next_datasets(self):
         self._slice_count += self._slice_increment
+        for path in self._readers:
+            self.read_stream(path, self._slice_increment)
+        if self._follow:
+            self.read_waiting_headers()
+            for path in self._csvs:
+                self.read_appended(path)
         
+    def require_columns(self, xident, yidents):
+        for (path, columns) in self.table_columns(xident, yidents).items():
+            if path in self._segment_tables:
+                continue # already completely loaded
+            if self._stream:
+                self.stream_columns(path, columns)
+            elif self._follow:
+                self.follow_columns(path, columns)
+            elif self._lazy:
+                self.load_columns(path, columns)
+
+    def table_columns(self, xident, yidents):
+        """Groups the columns a plot needs by the table they're in.  When
+        more than one table is involved, their time columns are needed
+        too so the tables can be lined up."""
+        tables = {}
+        for ident in [xident] + list(yidents):
+            tables.setdefault(ident[0], []).append(ident[1])
+        if len(tables) > 1:
+            for path in tables:
+                tables[path].append(self.time_column(path))
+        return tables
+
     def gather(self, xident, yidents, animate = False):
         columns = [xident[1]]
         for column in yidents:
             columns.append(column[1])
+
+        self.require_columns(xident, yidents)
+        if any([yident[0] != xident[0] for yident in yidents]):
+            df = self.join_tables(xident, yidents)
+        else:
+            df = self._dataframes[xident[0]]
+
+        if self._stream or self._follow:
+            # we only hold the rows read in since the last clear
+            return select_columns(df, columns)
+
         if animate:
-            return self._dataframes[xident[0]][columns][self._slice_start:self._slice_count]
+            return select_columns(df, columns,
+                                  self._slice_start, self._slice_count)
             
         # selects the table (xident[0]) with x and y columns (the 1s)
-        return self._dataframes[xident[0]][columns]
+        return select_columns(df, columns)
+
+    def gather_since(self, xident, yidents, cursor = None, animate = True):
+        (df, new, cursor) = self.gather_held(xident, yidents, cursor, animate)
+        return (df.iloc[len(df.index) - new:], cursor)
+
+    def gather_held(self, xident, yidents, cursor = None, animate = True):
+        # (selecting and slicing columns gives views of our dataframes)
+        df = self.gather(xident, yidents, animate)
+        if self._stream or self._follow:
+            # rows are indexed by their row number in the log file
+            if len(df.index) > 0:
+                first = df.index[0]
+            else:
+                first = self._stream_rows.get(xident[0], 0)
+        elif animate:
+            first = self._slice_start
+        else:
+            first = 0
+        return self.held_since(df, first, cursor)
+
+    def join_tables(self, xident, yidents):
+        """Lines up y columns from other tables with the rows of the x
+        column's table by matching each row to the nearest time in the
+        other tables (within join_tolerance seconds).  Joins are cached:
+        once none of the tables can grow the join is finished, and
+        otherwise only rows that could still change (those newer than
+        the latest time in every other table that's still growing) are
+        joined again, and only when a table has grown."""
+        key = (tuple(xident), tuple([tuple(yident) for yident in yidents]))
+        left = self._dataframes[xident[0]]
+        left_time = self.time_column(xident[0])
+        tables = self.table_columns(xident, yidents)
+        sizes = tuple([self.table_rows(path) for path in tables])
+
+        (joined, done, joined_sizes) = self._joins.get(key, (None, None, None))
+        if joined is not None and sizes == joined_sizes:
+            return joined # nothing has changed (or ever will)
+
+        first_row = left.index[0] if len(left.index) > 0 else 0
+        if (joined is None or len(left.index) == 0 or len(joined.index) == 0
+            or first_row < joined.index[0]):
+            # starting over (or the rows were replaced, eg, a restarted log)
+            joined = None
+            done = first_row
+
+        # (rows are numbered consecutively, so positions can be used)
+        start = done
+        pending = left.iloc[max(start - first_row, 0):]
+        pending_times = pending[left_time].to_numpy(dtype=float)
+        new_rows = {'_join_time': pending_times}
+        for column in tables[xident[0]][:-1]: # the last is the time column
+            new_rows[column] = pending[column].to_numpy()
+        new_rows = pd.DataFrame(new_rows)
+
+        # join in each of the other tables in turn
+        final_time = math.inf
+        for (path, columns) in tables.items():
+            if path == xident[0]:
+                continue
+            table = self._dataframes[path]
+            times = table[self.time_column(path)].to_numpy(dtype=float)
+
+            # only the rows from just before the pending ones are needed
+            first = 0
+            if len(pending.index) > 0:
+                first = max(0, int(np.searchsorted(times, pending_times[0])) - 1)
+            right = {'_join_time': times[first:]}
+            for column in columns[:-1]: # the last is the time column
+                right[column] = table[column].to_numpy()[first:]
+            right = pd.DataFrame(right)
+
+            if self.table_may_grow(path):
+                if len(right.index) > 0:
+                    final_time = min(final_time, right['_join_time'].iloc[-1])
+                else:
+                    final_time = -math.inf
+
+            new_rows = pd.merge_asof(new_rows, right, on='_join_time',
+                                     direction='nearest',
+                                     tolerance=self._join_tolerance)
+
+        new_rows.index = pending.index
+        new_rows = new_rows.drop(columns='_join_time')
+
+        # rows at or before the latest time in all the tables won't change
+        done = start + int(np.searchsorted(pending_times, final_time,
+                                           side='right'))
+
+        if joined is not None:
+            # keep the finished rows that are still in the x table
+            joined_first = joined.index[0]
+            joined = joined.iloc[max(first_row - joined_first, 0):
+                                 max(start - joined_first, 0)]
+            new_rows = pd.concat([joined, new_rows])
+
+        self._joins[key] = (new_rows, done, sizes)
+        return new_rows
+
+    def table_rows(self, path):
+        """The (first, last + 1) row numbers a log's dataframe holds"""
+        df = self._dataframes[path]
+        if len(df.index) == 0:
+            return (0, 0)
+        return (df.index[0], df.index[-1] + 1)
+
+    def table_may_grow(self, path):
+        """Whether more rows may still be read into a log's dataframe"""
+        if self._follow:
+            return True
+        return self._stream and self._readers.get(path) is not None
 
     def load_file(self, filename, directory = None):
         if directory:
@@ -62,73 +322,512 @@ class LogLoader(LoaderBase):
         else:
             path = filename
 
-        df = pd.read_csv(path)
+        self.load_files([path])
+        return self._dataframes[path]
+
+    def load_files(self, paths):
+        """Loads a list of log files, parsing them in parallel when more
+        than one worker was requested.  Results are always stored in
+        the order the paths were given."""
+        if self._follow:
+            # logs that were only just created may not have a header yet
+            waiting = [path for path in paths if not has_header(path)]
+            for path in waiting:
+                info(f"waiting for {path} to have a header")
+            self._waiting.extend(waiting)
+            paths = [path for path in paths if path not in waiting]
+
+        segment_tables = set(filter(is_segment_table, paths))
+        cached = {}
+        for path in paths:
+            if path not in segment_tables:
+                cached[path] = self.load_cached(path)
+        misses = [path for path in paths if cached.get(path, 0) is None]
+
+        if self._workers > 1 and len(misses) > 1:
+            with ProcessPoolExecutor(max_workers=self._workers) as pool:
+                dfs = list(pool.map(read_log_file, misses,
+                                    repeat(self._lazy)))
+        else:
+            dfs = map(read_log_file, misses, repeat(self._lazy))
+        parsed = dict(zip(misses, dfs))
+
+        for path in paths:
+            if path in segment_tables:
+                self.add_segment_table(path)
+            elif cached[path] is not None:
+                (cache_info, df) = cached[path]
+                self.add_cached_log(path, cache_info, df)
+            else:
+                self.add_log(path, parsed.pop(path))
+
+    def load_cached(self, path):
+        """Returns the cache information and a dataframe for a log file if
+        it can be loaded from the cache instead of being parsed."""
+        if not self._cache:
+            return None
+
+        info = self._cache.lookup(path)
+        if self._mmap and (not info
+                           or len(info['cached']) != len(info['columns'])):
+            info = self.convert_log(path)
+
+        if not info:
+            return None
+
+        if self._lazy:
+            return (info, pd.DataFrame())
+
+        data = self._cache.load(path, info['columns'], self._mmap)
+        if len(data) != len(info['columns']):
+            return None
+        # copy=False keeps memory mapped columns as zero-copy views
+        return (info, pd.DataFrame(data, columns=info['columns'], copy=False))
+
+    def convert_log(self, path):
+        """Converts a log file into memory mappable columns in the cache"""
+        columns = list(read_log_file(path, True).columns)
+        fake_localtime = 'localtime' not in columns
+        if fake_localtime:
+            columns.append('localtime')
+        if not self._cache.convert(path, columns, fake_localtime):
+            return None
+        return self._cache.lookup(path)
+
+    def add_cached_log(self, path, info, df):
+        """Stores a log file (or its header) loaded from the cache"""
+        if info['fake_localtime']:
+            self._fake_localtimes.add(path)
+        self._csvs.append(path)
+        self._columns[path] = info['columns']
+        self.index_table(path, info['columns'])
+        self._dataframes[path] = self.compact(path, self.apply_window(path, df))
+
+    def add_segment_table(self, path):
+        """Stores a table recorded by lime-record.  These are always read
+        in full, since they're already stored in a compact binary form
+        (and aren't CSVs that can be read a few rows at a time)."""
+        df = read_segments(path)
+        self._segment_tables.add(path)
+        self._columns[path] = list(df.columns)
+        self.index_table(path, self._columns[path])
+        self._dataframes[path] = self.compact(path, self.apply_window(path, df))
+
+    def add_log(self, path, df):
+        """Stores a parsed log file (or its header) under its path name"""
+        columns = list(df.columns)
+        if self._lazy:
+            # only the header was read; columns are read when first needed
+            df = pd.DataFrame()
         #df = df.loc[(df != 0).all(axis=1), :]
 
         # fake-create a timestamp if there isn't one
-        if 'localtime' not in df:
-            delta = .02 # should match real robot loop
-            # start_time = time.time()  # now, we plot into ethe future!
-            start_time = 0
-            end_time = start_time + delta * len(df)
-            localtimes = [start_time + x * delta for x in range(len(df))]
-            df['localtime'] = localtimes
-            
+        if 'localtime' not in columns:
+            self._fake_localtimes.add(path)
+            columns.append('localtime')
+            if not self._lazy:
+                self.add_localtime(df)
 
         self._csvs.append(path)
+        self._columns[path] = columns
+        self.index_table(path, columns)
+
+        if self._cache:
+            self._cache.store(path, columns, path in self._fake_localtimes,
+                              df)
+
+        df = self.compact(path, self.apply_window(path, df))
         self._dataframes[path] = df
+        return df
+
+    def compact(self, path, df, appendable = False):
+        """Shrinks the data types of a log's columns when asked to"""
+        if not self._compact or len(df.columns) == 0:
+            return df
+
+        df = df.copy(deep=False)
+        saved = compact_dataframe(df, appendable)
+        if not appendable:
+            info(f"compacted {len(df.columns)} columns of {path}: saved {saved} bytes")
+        return df
+
+    def time_column(self, path):
+        """Returns the column used for selecting time ranges in a log file"""
+        if 'timestamp' in self._columns[path]:
+            return 'timestamp'
+        return 'localtime'
+
+    def row_window(self, path, df = None):
+        """Returns the (first, last + 1) rows of the log file 'path' that
+        fall inside the requested time range, or None when there is no
+        time range.  The rows are found by a binary search over the
+        table's time column, which robot logs always write in order."""
+        if not self._time_range:
+            return None
+        if path in self._windows:
+            return self._windows[path]
+
+        (start, end) = self._time_range
+        column = self.time_column(path)
+        if column == 'localtime' and path in self._fake_localtimes:
+            # fake localtimes are evenly spaced, so no searching is needed
+            window = (max(0, math.ceil(start / LOCALTIME_DELTA)),
+                      max(0, math.floor(end / LOCALTIME_DELTA) + 1))
+        else:
+            if df is not None and column in df:
+                times = df[column].to_numpy()
+            else:
+                times = self.read_column(path, column)
+
+            if np.all(times[1:] >= times[:-1]):
+                window = (int(np.searchsorted(times, start, side='left')),
+                          int(np.searchsorted(times, end, side='right')))
+            else:
+                warning(f"{column} in {path} isn't sorted; using the rows from the first to last time in range")
+                inside = np.nonzero((times >= start) & (times <= end))[0]
+                if len(inside) > 0:
+                    window = (int(inside[0]), int(inside[-1]) + 1)
+                else:
+                    window = (0, 0)
+
+        self._windows[path] = window
+        return window
+
+    def apply_window(self, path, df):
+        """Trims a fully loaded log file down to just the time range rows"""
+        if len(df.columns) == 0:
+            return df # nothing has been loaded yet
+
+        window = self.row_window(path, df)
+        if not window:
+            return df
 
+        df = df.iloc[window[0]:window[1]].reset_index(drop=True)
+        if not self._mmap:
+            # let go of the memory used by the rows outside the range
+            df = df.copy()
         return df
 
+    def read_column(self, path, column):
+        """Returns every value of a single column from a log file"""
+        if self._cache:
+            cached = self._cache.load(path, [column], self._mmap)
+            if column in cached:
+                return cached[column]
+        return pd.read_csv(path, usecols=[column])[column].to_numpy()
+
+    def read_columns(self, path, columns):
+        """Parses 'columns' (within the time range) out of a log file"""
+        window = self.row_window(path)
+        if window:
+            (first, last) = window
+            return pd.read_csv(path, usecols=columns,
+                               skiprows=range(1, first + 1),
+                               nrows=last - first)
+        return pd.read_csv(path, usecols=columns)
+
+    def add_localtime(self, df, rows = None, first_row = 0):
+        if rows is None:
+            rows = len(df)
+        delta = LOCALTIME_DELTA
+        # start_time = time.time()  # now, we plot into ethe future!
+        start_time = 0
+        localtimes = [start_time + x * delta
+                      for x in range(first_row, first_row + rows)]
+        df['localtime'] = localtimes
+
+    def load_columns(self, path, columns):
+        """Reads any of the requested columns that haven't been loaded yet
+        from the log file 'path' (or its cache) into its dataframe."""
+        df = self._dataframes[path]
+        missing = [column for column in columns
+                   if column not in df and column in self._columns[path]]
+        if not missing:
+            return df
+
+        self.read_missing_columns(path, df, missing)
+
+        if self._compact:
+            compacted = self.compact(path, df[missing])
+            for column in missing:
+                df[column] = compacted[column]
+
+        return df
+
+    def read_missing_columns(self, path, df, missing):
+        """Adds the 'missing' columns to a log's dataframe from the cache
+        or, failing that, by parsing them out of the log file."""
+        window = self.row_window(path)
+        if self._cache:
+            cached = self._cache.load(path, missing, self._mmap)
+            for column in cached:
+                if window:
+                    df[column] = cached[column][window[0]:window[1]]
+                else:
+                    df[column] = cached[column]
+            missing = [column for column in missing if column not in cached]
+            if not missing:
+                return
+
+        file_columns = [column for column in missing
+                        if column != 'localtime'
+                        or path not in self._fake_localtimes]
+        if file_columns:
+            new_data = self.read_columns(path, file_columns)
+            for column in file_columns:
+                df[column] = new_data[column].to_numpy()
+
+        if len(missing) != len(file_columns):
+            rows = len(df.index)
+            if len(df.columns) == 0:
+                # we need at least one real column to know the length
+                first = self._columns[path][0]
+                rows = len(self.read_columns(path, [first]).index)
+            first_row = 0
+            if window:
+                first_row = window[0]
+            self.add_localtime(df, rows, first_row)
+
+        # partial columns from a time range can't be cached
+        if self._cache and not window:
+            self._cache.store(path, self._columns[path],
+                              path in self._fake_localtimes, df[missing])
+
+    def stream_columns(self, path, columns):
+        """Makes sure the streaming reader for the log file 'path' is
+        reading all of 'columns', (re)starting it if needed."""
+        wanted = self._stream_columns.setdefault(path, [])
+        new_columns = [column for column in columns
+                       if column not in wanted and column in self._columns[path]]
+        if path in self._readers and not new_columns:
+            return
+        wanted.extend(new_columns)
+
+        # restart at the first row we're still holding and re-read them
+        df = self._dataframes[path]
+        if len(df.index) > 0:
+            first_row = df.index[0]
+        else:
+            window = self.row_window(path)
+            first_row = self._stream_rows.get(path, window[0] if window else 0)
+
+        file_columns = [column for column in wanted
+                        if column != 'localtime'
+                        or path not in self._fake_localtimes]
+        if not file_columns:
+            # we need at least one real column to count rows with
+            file_columns = self._columns[path][:1]
+
+        self._readers[path] = pd.read_csv(path, usecols=file_columns,
+                                          skiprows=range(1, first_row + 1),
+                                          iterator=True)
+        self._stream_rows[path] = first_row
+        self._dataframes[path] = pd.DataFrame(columns=wanted)
+        if len(df.index) > 0:
+            self.read_stream(path, len(df.index))
+
+    def read_stream(self, path, rows):
+        """Reads the next 'rows' rows from a streamed log file"""
+        reader = self._readers[path]
+        if not reader:
+            return # we've hit the end of the file
+
+        window = self.row_window(path)
+        if window:
+            rows = min(rows, window[1] - self._stream_rows[path])
+            if rows <= 0:
+                # we've hit the end of the time range
+                reader.close()
+                self._readers[path] = None
+                return
+
+        try:
+            chunk = reader.get_chunk(rows)
+        except StopIteration:
+            reader.close()
+            self._readers[path] = None
+            return
+
+        first_row = self._stream_rows[path]
+        chunk.index = range(first_row, first_row + len(chunk.index))
+        if path in self._fake_localtimes:
+            self.add_localtime(chunk, first_row=first_row)
+        self._stream_rows[path] = first_row + len(chunk.index)
+        self.append_rows(path, chunk)
+
+    def read_waiting_headers(self):
+        """Loads the headers of followed logs that didn't have one yet"""
+        ready = [path for path in self._waiting if has_header(path)]
+        self._waiting = [path for path in self._waiting if path not in ready]
+        self.load_files(ready)
+
+    def wait_for_headers(self, column_name):
+        """Waits for followed logs without headers to get them, until
+        one of them has column_name (or none are left waiting)"""
+        while self._waiting and not self.find_column_table(column_name):
+            time.sleep(.1)
+            self.read_waiting_headers()
+
+    def follow_columns(self, path, columns):
+        """Makes sure a followed log file is being read for all of
+        'columns', reading it again from the start for any new ones"""
+        wanted = self._stream_columns.setdefault(path, [])
+        new_columns = [column for column in columns
+                       if column not in wanted and column in self._columns[path]]
+        if not new_columns:
+            return
+        wanted.extend(new_columns)
+        self._offsets.pop(path, None)
+        self.read_appended(path)
+
+    def read_appended(self, path):
+        """Parses just the complete lines appended to a followed log file
+        since the last time we looked at it, keeping only the columns
+        being plotted and the rows within the time range."""
+        wanted = self._stream_columns.get(path, [])
+        size = os.path.getsize(path)
+        offset = self._offsets.get(path)
+        if offset is None or size < offset:
+            # our first look, or the log was restarted: skip the header
+            self.new_generation()
+            with open(path, "rb") as fh:
+                offset = len(fh.readline())
+            self._offsets[path] = offset
+            self._stream_rows[path] = 0
+            self._file_rows[path] = 0
+            self._dataframes[path] = pd.DataFrame(columns=wanted)
+
+        if size <= offset or not wanted:
+            return # (rows are read once something needs their columns)
+
+        with open(path, "rb") as fh:
+            fh.seek(offset)
+            data = fh.read(size - offset)
+
+        # leave any partially written line for next time
+        end = data.rfind(b"\n")
+        if end < 0:
+            return
+        data = data[:end + 1]
+        self._offsets[path] = offset + len(data)
+
+        file_columns = [column for column in self._columns[path]
+                        if column != 'localtime'
+                        or path not in self._fake_localtimes]
+        time_column = self.time_column(path)
+        needed = set(wanted)
+        if self._time_range:
+            needed.add(time_column)
+        use_columns = [column for column in file_columns if column in needed]
+        if not use_columns:
+            # we need at least one real column to count rows with
+            use_columns = file_columns[:1]
+        chunk = pd.read_csv(io.BytesIO(data), header=None, names=file_columns,
+                            usecols=use_columns)
+
+        file_row = self._file_rows[path]
+        self._file_rows[path] = file_row + len(chunk.index)
+        if path in self._fake_localtimes:
+            self.add_localtime(chunk, first_row=file_row)
+        if self._time_range:
+            (start, stop) = self._time_range
+            times = chunk[time_column].to_numpy(dtype=float)
+            chunk = chunk[(times >= start) & (times <= stop)]
+
+        # (rows are numbered by the ones we keep)
+        first_row = self._stream_rows[path]
+        chunk.index = range(first_row, first_row + len(chunk.index))
+        self._stream_rows[path] = first_row + len(chunk.index)
+        self.append_rows(path, chunk[[column for column in wanted
+                                      if column in chunk]])
+
+    def append_rows(self, path, chunk):
+        """Adds newly read rows to a streamed or followed log's dataframe"""
+        chunk = self.compact(path, chunk, appendable=True)
+        df = self._dataframes[path]
+        if len(df.index) > 0:
+            chunk = pd.concat([df, chunk])
+        if self._stream_max_rows and len(chunk.index) > self._stream_max_rows:
+            chunk = chunk.iloc[-self._stream_max_rows:]
+        self._dataframes[path] = chunk
+
     def clear(self):
         self._csvs = []
         self._dataframes = {}
+        self._columns = {}
+        self._fake_localtimes = set()
+        self._windows = {}
+        self._readers = {}
+        self._stream_columns = {}
+        self._stream_rows = {}
+        self._offsets = {}
+        self._file_rows = {}
+        self._waiting = []
+        self._joins = {}
+        self._segment_tables = set()
+        self.clear_index()
+        self.new_generation()
+
+    def find_log_files(self, directory):
+        """Returns the paths of all the (possibly compressed) csvs in a
+        directory, along with any tables recorded by lime-record"""
+        return [directory + "/" + filename
+                for filename in os.listdir(directory)
+                if is_log_file(filename)
+                or is_segment_table(directory + "/" + filename)]
 
     def load_directory(self, directory = None, clear_old = True):
         if not directory:
             directory = self._directory
 
-        # Find all csvs in dir
-        files = (os.listdir(directory))
-
         # clear old
         if clear_old:
             self.clear()
     
         # load each file in the directory
-        for filename in files:
-            if not filename.endswith(".csv"):
-                continue
-
-            self.load_file(filename, directory)
+        self.load_files(self.find_log_files(directory))
 
         return self._dataframes
 
     def load_file_or_directory(self, thing):
-        if os.path.isdir(thing):
+        if os.path.isdir(thing) and not is_segment_table(thing):
             return self.load_directory(thing)
         else:
             self.load_file(thing)
 
     def load_file_or_directories(self, things):
+        # collect everything first so all files can be parsed together
+        paths = []
         for thing in things:
-            self.load_file_or_directory(thing)
+            if os.path.isdir(thing) and not is_segment_table(thing):
+                paths.extend(self.find_log_files(thing))
+            else:
+                paths.append(thing)
+        self.load_files(paths)
 
     def find_column_identifier(self, column_name):
-        for filename in self._dataframes:
-            if column_name in self._dataframes[filename]:
-                return [filename, column_name]
+        self.wait_for_headers(column_name)
+        results = super().find_column_identifier(column_name)
+        if results:
+            return results
         raise ValueError(f"Failed to find '{column_name}' value")
 
     def find_column_timestamp_identifier(self, column_name, matching = 'timestamp'):
-        for filename in self._dataframes:
-            if column_name in self._dataframes[filename]:
-                return [filename, matching]
+        self.wait_for_headers(column_name)
+        results = super().find_column_timestamp_identifier(column_name,
+                                                           matching)
+        if results:
+            return results
         raise ValueError(f"Failed to find '{column_name}' (x axis) value")
 
     def clear_data(self):
         # we just restart the starting time notion 
         self._slice_start = self._slice_count
+        self.new_generation()
+        if self._stream or self._follow:
+            # and forget the rows we've read in so far
+            for path in self._dataframes:
+                self._dataframes[path] = self._dataframes[path].iloc[0:0]
 
 if __name__ == "__main__":
     thing = "../792"
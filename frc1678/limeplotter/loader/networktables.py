@@ -1,14 +1,20 @@
 import time
+import atexit
 import logging
-from logging import error
+import threading
+from functools import partial
+from logging import error, info
 
 from networktables import NetworkTables
 
 import argparse
 import sys
+import numpy as np
 import pandas as pd
 
 from frc1678.limeplotter.loader import LoaderBase
+from frc1678.limeplotter.loader.buffer import TableBuffer
+from frc1678.limeplotter.loader.collector import Collector
 
 def parse_args():
     parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
@@ -29,18 +35,45 @@ def parse_args():
 
 DEFAULT_TIMESTAMP='localtime'
 
+# value changes arriving this close together (without any key changing
+# twice) came from the same networktables update, and share a row
+UPDATE_SECONDS = .01
+
 class NetworkTablesLoader(LoaderBase):
-    def __init__(self, server, plots=[{}], ignore_zeros=False):
+    def __init__(self, server, plots=[{}], ignore_zeros=False,
+                 time_range=None, compact=False, retention_rows=None,
+                 retention_seconds=None, listen=False, collect_rate=None):
         self._server = server
         self._plots = plots
-        self._time = 0.0
         self._network_table_list = None
         self._ignore_zeros = ignore_zeros
+        self._time_range = time_range
+        self._start_time = None
+        self._plot_tables = None
+        self._compact = compact
+        self._retention_rows = retention_rows
+        self._retention_seconds = retention_seconds
+        self._listen = listen
+        self._collector = None
+        if collect_rate and not listen:
+            self._collector = Collector(self.sample, collect_rate,
+                                        name="networktables collector")
+        self._listening = set()
+        self._held = {}
+        self._pending = {} # table -> (keys changed, time) of its open row
+        # listeners are called from the networktables thread
+        self._lock = threading.RLock()
+        if compact:
+            atexit.register(self.report_compacted)
     
     def animate_only(self):
         """This loader only loads data over time, and thus must be
         animated."""
         return True
+
+    def can_share_gathers(self):
+        """(dropping rows with zeros depends on the columns asked for)"""
+        return not self._ignore_zeros
     
     def open_networktables(self):
         """Opens the networktables server connection"""
@@ -61,34 +94,124 @@ class NetworkTablesLoader(LoaderBase):
 
         if table not in self._nettables:
             self._nettables[table] = NetworkTables.getTable(table)
-            self._tables[table] = {}
+            self._tables[table] = TableBuffer(max_rows=self._retention_rows,
+                                              max_seconds=self._retention_seconds)
+            self._held[table] = {}
         
         y = yident[1]
 
-        self._tables[table][x] = []
-        self._tables[table][y] = [] # overwriting is ok if done
+        # (listeners may be adding rows at the same time)
+        with self._lock:
+            self.add_column(table, x)
+            self.add_column(table, y)
+        self.index_table(table, [x, y])
+
+    def add_column(self, table, column):
+        """Creates the storage for a column's values.  When compacting,
+        values are stored as 4 byte floats (times always keep full
+        precision)."""
+        dtype = np.float64
+        if self._compact and column != DEFAULT_TIMESTAMP:
+            dtype = np.float32
+        self._tables[table].add_column(column, dtype)
+
+    def report_compacted(self):
+        """Logs how much memory storing 4 byte floats has saved for each
+        table, over all the rows stored in it so far"""
+        with self._lock:
+            # (nothing is stored until we're opened)
+            for (table, buffer) in getattr(self, '_tables', {}).items():
+                columns = [column for column in buffer.columns
+                           if buffer.dtype(column) != np.float64]
+                per_row = sum([8 - buffer.dtype(column).itemsize
+                               for column in columns])
+                # (every row stored, including those since dropped)
+                saved = per_row * (buffer.dropped + len(buffer))
+                info(f"compacted {len(columns)} columns of {table}: saved {saved} bytes")
 
     def setup_table_storage(self):
-        if self._tables:
+        if not self._tables:
+            for plot in self._plots:
+                for subplot in plot:
+                    if subplot['data_source'] != self:
+                        continue # not it!
+
+                    if 'x' in subplot:
+                        x = subplot['x']
+                    else:
+                        x = DEFAULT_TIMESTAMP
+
+                    for yident in subplot['yidents']:
+                        if yident is None:
+                            logging.error(f"Unable to find Y column {subplot['y'][0]}")
+                            logging.error(f"   in plot: {subplot}")
+                            exit()
+                        self.setup_table_entry(x, yident)
+
+        if self._listen:
+            self.start_listening()
+
+    def start_listening(self):
+        """Adds a value change listener to every table we're storing that
+        doesn't have one yet"""
+        if self._start_time is None:
+            self._start_time = time.time()
+        for table in self._nettables:
+            if table in self._listening:
+                continue
+            self._listening.add(table)
+            self._nettables[table].addEntryListener(
+                partial(self.value_changed, table), immediateNotify=True)
+
+    def in_time_range(self, now):
+        """Returns True if 'now' is within the requested time range,
+        measured in seconds since we started collecting"""
+        if self._start_time is None:
+            self._start_time = now
+        if not self._time_range:
+            return True
+        elapsed = now - self._start_time
+        return self._time_range[0] <= elapsed <= self._time_range[1]
+
+    def value_changed(self, table, source, key, value, is_new):
+        """Records the changes to the columns we're storing.  Changes that
+        arrive together in one networktables update share a row, which
+        is only stored once a key in it changes again (or the update is
+        over); the table's other columns keep (hold) their last
+        received values."""
+        if key not in self._tables[table] or isinstance(value, str):
             return
-    
-        self._tables = {}
-        for plot in self._plots:
-            for subplot in plot:
-                if subplot['data_source'] != self:
-                    continue # not it!
-
-                if 'x' in subplot:
-                    x = subplot['x']
-                else:
-                    x = DEFAULT_TIMESTAMP
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return # arrays and other things we can't plot
+        now = time.time()
+        with self._lock:
+            pending = self._pending.get(table)
+            if pending and (key in pending[0]
+                            or now - pending[1] > UPDATE_SECONDS):
+                self.store_row(table)
+                pending = None
+
+            self._held[table][key] = value
+            if pending:
+                pending[0].add(key)
+            elif self.in_time_range(now):
+                self._pending[table] = ({key}, now)
+
+    def store_row(self, table):
+        """Stores a table's open row of held values, if it has one"""
+        pending = self._pending.pop(table, None)
+        if not pending:
+            return
+        held = self._held[table]
+        held[DEFAULT_TIMESTAMP] = pending[1] - self._start_time
+        self._tables[table].append(held, pending[1])
 
-                for yident in subplot['yidents']:
-                    if yident is None:
-                        logging.error(f"Unable to find Y column {subplot['y'][0]}")
-                        logging.error(f"   in plot: {subplot}")
-                        exit()
-                    self.setup_table_entry(x, yident)
+    def store_rows(self):
+        with self._lock:
+            for table in list(self._pending):
+                self.store_row(table)
 
     @property
     def variables_available(self):
@@ -100,7 +223,12 @@ class NetworkTablesLoader(LoaderBase):
         while not NetworkTables.isConnected():
             time.sleep(.1)
 
-        # collect all the tables and all the rows in each table
+        self._network_table_list = self.discover_tables()
+        return self._network_table_list
+
+    def discover_tables(self):
+        """Collects all the tables and all the rows in each table the
+        server is currently publishing"""
         results = {}
         tables = NetworkTables.getGlobalTable().getSubTables()
         for table in tables:
@@ -109,42 +237,87 @@ class NetworkTablesLoader(LoaderBase):
             keys = net_table.getKeys()
             for key in keys:
                 results[table][key] = key
-                
-        self._network_table_list = results
+            self.index_table(table, keys)
         return results
 
     def gather_next_datasets(self):
         """Loops through the existing tables and columns and fetches 
            the next set of data from the nettables server.
+           When listening or collecting in the background, new data
+           arrives by itself instead.
         """
         self.setup_table_storage()
-        self._time += 1.0
+        if self._listen:
+            return
+        if self._collector:
+            self._collector.start()
+            return
+        self.sample()
+
+    def sample(self):
+        """Fetches the current value of every stored column"""
+        now = time.time()
+        if not self.in_time_range(now):
+            return
+
+        rows = {}
         for table in self._tables:
-            for column in self._tables[table]:
+            values = {}
+            for column in self._tables[table].columns:
                 if column == DEFAULT_TIMESTAMP:
-                    value = self._time
+                    value = now - self._start_time
                 else:
                     value = self._nettables[table].getNumber(column, 0.0) # default to 0 if no data
-                self._tables[table][column].append(value)
+                values[column] = value
                 #print(table + "/" + column + " = " + str(value))
+            rows[table] = values
+
+        with self._lock:
+            for table in rows:
+                self._tables[table].append(rows[table], now)
         #print(self._tables)
 
     def gather(self, xident, yidents, animate):
         # animate is pretty much always useless to us since
         # we don't have a "get everything" type of source
         # thus we ignore it and return everything we have always
+        return self.drop_zeros(self.gather_columns(xident, yidents))
+
+    def gather_since(self, xident, yidents, cursor = None, animate = True):
+        with self._lock:
+            (df, new, cursor) = self.held_columns(xident, yidents, cursor)
+        return (self.drop_zeros(df.iloc[len(df.index) - new:]), cursor)
+
+    def gather_held(self, xident, yidents, cursor = None, animate = True):
+        if self._ignore_zeros:
+            return None # the rows kept depend on the columns gathered
+        return self.held_columns(xident, yidents, cursor)
+
+    def held_columns(self, xident, yidents, cursor):
+        """Returns views of every held row of the columns (see gather_held)"""
+        with self._lock:
+            df = self.gather_columns(xident, yidents)
+            first = 0
+            if xident and xident[0] in self._tables:
+                first = self._tables[xident[0]].dropped
+            return self.held_since(df, first, cursor)
+
+    def gather_columns(self, xident, yidents):
         datastruct = {}
-        if xident:
-            if xident[0] == DEFAULT_TIMESTAMP:
-                datastruct[DEFAULT_TIMESTAMP] = time.time()
-            elif xident[0] not in self._tables:
-                raise ValueError(f"failed to find table '{xident[0]}' in networktables data {xident}")
-            else:
-                datastruct[xident[1]] = self._tables[xident[0]][xident[1]]
-        for yident in yidents:
-            datastruct[yident[1]] = self._tables[yident[0]][yident[1]]
-        df = pd.DataFrame(datastruct,
-                          columns=list(datastruct.keys()))
+        with self._lock:
+            self.store_rows()
+            if xident:
+                if xident[0] not in self._tables:
+                    raise ValueError(f"failed to find table '{xident[0]}' in networktables data {xident}")
+                else:
+                    datastruct[xident[1]] = self._tables[xident[0]].view(xident[1])
+            for yident in yidents:
+                datastruct[yident[1]] = self._tables[yident[0]].view(yident[1])
+        # copy=False makes the columns views of our buffers
+        return pd.DataFrame(datastruct,
+                            columns=list(datastruct.keys()), copy=False)
+
+    def drop_zeros(self, df):
         if self._ignore_zeros:
             df = df.loc[(df != 0).all(axis=1), :]
             #df[df != 0.].dropna(axis=1)
@@ -152,7 +325,7 @@ class NetworkTablesLoader(LoaderBase):
 
     def debug_print(self):
         for table in self._tables:
-            for column in self._tables[table]:
+            for column in self._tables[table].columns:
                 print(table + "/" + column + ": " + str(self._nettables[table].getNumber(column, 'N/A')))
 
     def _get_a_result(self):
@@ -162,37 +335,78 @@ class NetworkTablesLoader(LoaderBase):
             setattr(self, '_results', results)
         return results
 
+    def find_plot_table(self, column_name):
+        """Returns the table a plot configuration explicitly listed for a
+        column, for columns the server hasn't published (yet)."""
+        if self._plot_tables is None:
+            self._plot_tables = {}
+            for plot in self._plots:
+                for subplot in plot:
+                    if not subplot.get('table'):
+                        continue
+                    for column in [subplot['x']] + subplot['y']:
+                        self._plot_tables.setdefault(column, subplot['table'])
+        return self._plot_tables.get(column_name)
+
     def find_column_identifier(self, column_name):
-        results = super().find_column_identifier(column_name, self.variables_available)
+        self.variables_available # makes sure the tables are indexed
+        results = super().find_column_identifier(column_name)
         if results:
             return results
 
         # hope we already have plot info then
-        for plot in self._plots:
-            for subplot in plot:
-                if subplot['x'] == column_name:
-                    return [subplot['table'], subplot['x']]
-                elif subplot['y'] == column_name:
-                    return [subplot['table'], subplot['y']]
+        table = self.find_plot_table(column_name)
+        if table:
+            return [table, column_name]
 
     def find_column_timestamp_identifier(self, column_name,
                                          matching = DEFAULT_TIMESTAMP):
+        self.variables_available # makes sure the tables are indexed
         results = super().find_column_timestamp_identifier(column_name,
-                                                           self.variables_available,
                                                            matching)
         if results:
             return results
 
         # hope we already have plot info then
-        for plot in self._plots:
-            for subplot in plot:
-                if subplot['y']== column_name:
-                    return [subplot['table'], matching] # they better be transmitting this!
+        table = self.find_plot_table(column_name)
+        if table:
+            return [table, matching] # they better be transmitting this!
+
+    def take_data(self):
+        """Returns copies of every table's collected columns, along with
+        a 'walltime' column of when each row arrived, and then forgets
+        them."""
+        results = {}
+        with self._lock:
+            self.store_rows()
+            for (table, buffer) in self._tables.items():
+                if len(buffer) == 0:
+                    continue
+                columns = {column: buffer.view(column).copy()
+                           for column in buffer.columns}
+                columns['walltime'] = buffer.times().copy()
+                results[table] = columns
+                buffer.clear()
+            self.new_generation()
+        return results
+
+    @property
+    def start_time(self):
+        """When data collection started (localtime 0), in epoch seconds"""
+        return self._start_time
+
+    @property
+    def collected_rows(self):
+        return sum([len(buffer) for buffer in self._tables.values()])
 
     def clear_data(self):
-        for table in self._tables:
-            for column in self._tables[table]:
-                self._tables[table][column] = []
+        if self._compact:
+            self.report_compacted()
+        with self._lock:
+            for table in self._tables:
+                self._tables[table].clear()
+            self._pending.clear()
+            self.new_generation()
 
     def load_n_rows(self, n=100, sleep=.100):
         for num in range(n):
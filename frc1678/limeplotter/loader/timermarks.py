@@ -25,6 +25,10 @@ class TimerMarks(LoaderBase):
         self._xident = self._data_source.find_column_identifier(self._x)
         self._yident = self._data_source.find_column_identifier(self._y)
 
+    def require_columns(self, xident, yidents):
+        # we only ever gather our own columns from the source
+        self._data_source.require_columns(self._xident, [self._yident])
+
     @property
     def dataframes(self):
         return self._dataframes
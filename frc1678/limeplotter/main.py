@@ -8,6 +8,7 @@ Author: Wes Hardaker
 """
 
 import time
+import numpy as np
 import pandas as pd
 import yaml
 import matplotlib
@@ -17,12 +18,18 @@ import math
 from logging import debug, info, warning, error, critical, basicConfig
 
 from matplotlib.animation import FuncAnimation
-from matplotlib.path import Path
+from matplotlib.transforms import Affine2D
+from matplotlib.collections import LineCollection
 
 from frc1678.limeplotter.loader.log import LogLoader
 from frc1678.limeplotter.loader.timermarks import TimerMarks
 from frc1678.limeplotter.loader.networktables import NetworkTablesLoader
 from frc1678.limeplotter.loader.svg import SVGLoader
+from frc1678.limeplotter.loader.cache import ColumnCache, DEFAULT_CACHE_DIRECTORY, DEFAULT_CACHE_SIZE
+from frc1678.limeplotter.blit import BlitAnimation, grow_limits
+from frc1678.limeplotter.gather import group_entries, entry_columns
+from frc1678.limeplotter.plan import compile_plan
+from frc1678.limeplotter.decimate import pixel_decimate, Decimator, DECIMATION_METHODS
 
 import argparse
 import sys
@@ -40,6 +47,14 @@ save_button = None
 saved_plots = None
 save_data = False
 saved_one = False
+blitting = False
+limits_grew = False
+limited_axes = set()
+render_plan = None
+table_gathers = []
+frozen_tracks = {}
+decimator = Decimator("none")
+log_options = {}
 
 def parse_args():
     parser = argparse.ArgumentParser(epilog = "Example usage: log-plotter.py -y 2021.yml -Y -a -f 50 drivetrain_status.csv")
@@ -62,13 +77,61 @@ def parse_args():
                        help="NetworkTables server address to get data from")
 
     group.add_argument("-t", "--time-range", nargs=2, type=float,
-                       help="Only plot data between two time stamps")
+                       help="Only plot data between two time stamps (for -N, seconds since starting)")
 
     group.add_argument("-X", "--default-x", default="timestamp", type=str,
                        help="Default x column when not specified")
 
     group.add_argument("-T", "--default-table", default=None, type=str,
                        help="Default table name when not specified")
+
+    group.add_argument("--lazy", action="store_true",
+                       help="Only read the log file columns that are actually plotted")
+
+    group.add_argument("-j", "--jobs", default=1, type=int,
+                       help="Number of processes used to parse log files in parallel (0 = one per CPU)")
+
+    group.add_argument("--no-cache", action="store_true",
+                       help="Don't use (or create) the parsed log file cache")
+
+    group.add_argument("--clear-cache", action="store_true",
+                       help="Empty the parsed log file cache before loading")
+
+    group.add_argument("--cache-dir", default=DEFAULT_CACHE_DIRECTORY, type=str,
+                       help="Where to store the parsed log file cache")
+
+    group.add_argument("--cache-size", default=DEFAULT_CACHE_SIZE, type=int,
+                       help="Maximum size of the parsed log file cache (MB)")
+
+    group.add_argument("--mmap", action="store_true",
+                       help="Memory map log columns from the cache instead of reading them into memory")
+
+    group.add_argument("--stream", action="store_true",
+                       help="Read log files a few rows at a time while animating instead of all at once")
+
+    group.add_argument("--follow", action="store_true",
+                       help="Keep reading new lines appended to log files as they're written (like tail -f)")
+
+    group.add_argument("--join-tolerance", default=None, type=float,
+                       help="When plotting columns from different log files together, the maximum time difference (seconds) between matched rows")
+
+    group.add_argument("--retention-rows", default=None, type=int,
+                       help="Only keep this many of the most recent rows from network tables")
+
+    group.add_argument("--retention-seconds", default=None, type=float,
+                       help="Only keep this many seconds of the most recent data from network tables")
+
+    group.add_argument("--listen", action="store_true",
+                       help="Record every network tables value change as it arrives instead of polling once per animation frame")
+
+    group.add_argument("--collect-rate", default=None, type=float,
+                       help="Poll network tables this many times per second in the background, independent of the animation frame rate")
+
+    group.add_argument("--compact", action="store_true",
+                       help="Store loaded data using smaller data types (float32, small ints, bools, categories)")
+
+    group.add_argument("--stream-rows", default=0, type=int,
+                       help="The maximum number of rows to keep in memory while streaming or following (0 = no limit)")
     
     group = parser.add_argument_group("Graphics controls") 
 
@@ -82,6 +145,12 @@ def parse_args():
     group.add_argument("-a", "--animate", action="store_true",
                        help="Animate the plot")
 
+    group.add_argument("--blit", action="store_true",
+                       help="When animating, only redraw the plotted data each frame (faster); axis limits grow in steps instead of every frame")
+
+    group.add_argument("--decimate", default="minmax", choices=DECIMATION_METHODS,
+                       help="How to reduce the plotted points to what can be seen on screen: min/max per pixel column (keeps every peak), largest triangle three buckets, or none")
+
     group.add_argument("-f", "--animation-frames", default=10, type=int,
                        help="Number of frames to plot each time for speed")
 
@@ -128,12 +197,26 @@ def parse_args():
     global animate_frames
     animate_frames = args.animation_frames
 
+    global decimator
+    decimator = Decimator(args.decimate)
+
     global save_data
     if args.save_data:
         save_data = args.save_data
 
     return args
 
+def entry_data(plot_entry):
+    """Returns a DataFrame of a plot entry's columns, or None if nothing
+    has been gathered for it yet"""
+    columns = plot_entry.get('columns')
+    if columns is None:
+        return None
+    names = entry_columns(plot_entry)
+    # copy=False makes the columns views of the gathered data
+    return pd.DataFrame({name: columns[name] for name in names},
+                        columns=names, copy=False)
+
 def gather_new_data(plot_info, animate):
     """Gather's the next round of data to plot when animating"""
     global saved_one
@@ -141,26 +224,29 @@ def gather_new_data(plot_info, animate):
         data_source.gather_next_datasets()
     save_data_storage = []
     save_headers = []
+    new_rows = 0
+    # each table is gathered once for all the entries plotting from it
+    for table_gather in table_gathers:
+        new_rows += table_gather.gather(animate)
+
     for plot_entry in plot_info:
-        # will return a pandas dataframe with x, y
         ds = plot_entry['data_source']
-        debug(f"gathering: {plot_entry['xident']} -- {plot_entry['yidents']}")
-        plot_entry['data'] = ds.gather(plot_entry['xident'],
-                                       plot_entry['yidents'],
-                                       animate)
-        debug(f"results: {plot_entry['data']}")
+        # (only format the data when debugging, since it's slow)
+        debug("results: %s -- %s: %s", plot_entry['xident'],
+              plot_entry['yidents'], plot_entry.get('columns'))
         if not saved_one:
             save_headers.append(plot_entry['xident'][-1])
             save_headers.extend([y[-1] for y in plot_entry['yidents']])
         if save_data:
-            line = plot_entry['data'][:][-1:].to_csv(header=False, index=False).strip()
+            line = entry_data(plot_entry)[-1:].to_csv(header=False, index=False).strip()
             save_data_storage.append(line)
         if 'annotate' in plot_entry['options']:
             ds.annotate(plot_entry['axis'],
-                        plot_entry['data'],
+                        entry_data(plot_entry),
                         plot_entry['options']['annotate'])
 
-    if save_data:
+    # only save a line when something has changed
+    if save_data and new_rows > 0:
         if not saved_one:
             saved_one = True
             save_data.write(",".join(save_headers) + "\n")
@@ -177,146 +263,171 @@ def init_animate():
 
     return animate_plots
 
+def data_extents(plot_entry, column, data, offset):
+    """Returns the (min, max) of a plot entry's values in column (or
+    just the 'last' ones), plus any offset"""
+    extents = None
+    if column in plot_entry.get('extents', {}):
+        extents = plot_entry['extents'][column].extents
+    if extents is None:
+        if len(data) == 0:
+            # no rows (eg, just cleared), so leave the limits alone
+            return (math.nan, math.nan)
+        # no numbers yet (or not numbers at all)
+        extents = (data.min(), data.max())
+    return (extents[0] + offset, extents[1] + offset)
+
+def offset_transform(plot_entry):
+    """Returns the transform that draws a plot entry's data shifted by
+    its xoff and yoff options, so the data itself needn't be offset"""
+    options = plot_entry['options']
+    offsets = Affine2D().translate(float(options.get('xoff', 0)),
+                                   float(options.get('yoff', 0)))
+    return offsets + plot_entry['axis'].transData
+
 def update_animate(i):
     """Updates the animation data with 'animate_frames' new frames"""
     gather_new_data(plot_info, True)
     plots_touched = []
-    for (axis_index, subplot) in enumerate(saved_plots):
-        xlims = [1e10,-1e10]
-        ylims = [1e10,-1e10]
-        plot_entry = None
-        update_x_limits = True
-        update_y_limits = True
-        for entry in subplot:
-            plot_entry = entry
-
-            # skip non-data entries like images
-            if 'data' not in plot_entry:
-                continue
-
-            # gather the x axis data
-            if 'x' not in plot_entry or type(plot_entry['data']) == None:
-                warn("animate update: no x")
-                warn(str(plot_entry))
-                continue
-            
-            xdata = plot_entry['data'][plot_entry['x']]
-            if 'xoff' in plot_entry['options']:
-                xdata = xdata + float(plot_entry['options']['xoff'])
-
-            if 'last' in plot_entry['options']:
-                xdata = xdata[-int(plot_entry['options']['last']):-1]
-
-            xlims[0] = min(xdata.min(), xlims[0])
-            xlims[1] = max(xdata.max(), xlims[1])
-
-            # gather all the associated y axis data
-            for y in plot_entry['y']:
-                ydata = plot_entry['data'][y]
-                if 'last' in plot_entry['options']:
-                    ydata = ydata[-int(plot_entry['options']['last']):-1]
-
-                if 'yoff' in plot_entry['options']:
-                    ydata = ydata + float(plot_entry['options']['yoff'])
-
-                ylims[0] = min(ydata.min(), ylims[0])
-                ylims[1] = max(ydata.max(), ylims[1])
-
-                plot_entry['plot'].set_data(xdata, ydata)
-                plots_touched.append(plot_entry['plot'])
+    line_data = []
+    # [xmin, xmax, ymin, ymax] of each axis in the plan
+    limits = [None] * len(render_plan.axes)
+    for plan in render_plan.entries:
+        # skip entries without any data yet
+        columns = plan.entry.get('columns')
+        if columns is None:
+            continue
 
-            if 'x_axis_set' in plot_entry:
-                update_x_limits = False
+        # (the offsets are applied by the line's transform)
+        xdata = columns[plan.x][-plan.last:]
+        (xmin, xmax) = data_extents(plan.entry, plan.x, xdata, plan.xoffset)
+        (ymin, ymax) = (1e10, -1e10)
+
+        # gather all the associated y axis data
+        for (y, line) in zip(plan.ys, plan.lines):
+            ydata = columns[y][-plan.last:]
+            extents = data_extents(plan.entry, y, ydata, plan.yoffset)
+            ymin = min(extents[0], ymin)
+            ymax = max(extents[1], ymax)
+
+            # (set once the limits are, so it can be decimated to fit them)
+            line_data.append((line, xdata, ydata))
+            plots_touched.append(line)
+
+        axis_limits = limits[plan.axis_index]
+        if axis_limits is None:
+            limits[plan.axis_index] = [xmin, xmax, ymin, ymax]
+        else:
+            axis_limits[0] = min(xmin, axis_limits[0])
+            axis_limits[1] = max(xmax, axis_limits[1])
+            axis_limits[2] = min(ymin, axis_limits[2])
+            axis_limits[3] = max(ymax, axis_limits[3])
 
-            if 'y_axis_set' in plot_entry:
-                update_y_limits = False
+    for (axis_plan, axis_limits) in zip(render_plan.axes, limits):
+        if axis_limits is None:
+            continue
+        (xlims, ylims) = (axis_limits[:2], axis_limits[2:])
+        if math.isnan(xlims[0]) or math.isnan(ylims[0]):
+            continue
 
-        if math.isnan(xlims[0]):
+        axis = axis_plan.axis
+        if blitting:
+            # only grow the limits (in steps) since changing them means
+            # redrawing the whole background
+            grow_axis_limits(axis, xlims, ylims,
+                             axis_plan.update_x_limits,
+                             axis_plan.update_y_limits)
             continue
 
-        # steals last plot from loop
-        if update_x_limits:
-            plot_entry['axis'].set_xlim(xlims)
+        # (emit=False since the lines' data is about to be set anyway)
+        if axis_plan.update_x_limits:
+            axis.set_xlim(xlims, emit=False)
             
-        if update_y_limits:
-            plot_entry['axis'].set_ylim(ylims)
+        if axis_plan.update_y_limits:
+            axis.set_ylim(ylims, emit=False)
 
-        if update_x_limits or update_y_limits:
-            plot_entry['axis'].relim()
-            plot_entry['axis'].autoscale_view()
+        if axis_plan.update_x_limits or axis_plan.update_y_limits:
+            axis.relim()
+            axis.autoscale_view()
 
-        #plot_entry['axis'].get_yaxis().set_ylim(ylims)
-
-    # for ds in data_sources:
-    #     ds.debug_print()
+    for (line, xdata, ydata) in line_data:
+        decimator.set_data(line, xdata, ydata)
 
     return plots_touched
 
+def grow_axis_limits(axis, xlims, ylims, update_x_limits, update_y_limits):
+    global limits_grew
+    # (the limits of axes without any data yet are just matplotlib's default)
+    fresh = axis not in limited_axes
+    limited_axes.add(axis)
+    if update_x_limits:
+        new_limits = grow_limits(None if fresh else axis.get_xlim(), xlims)
+        if new_limits:
+            axis.set_xlim(new_limits, emit=False)
+            limits_grew = True
+    if update_y_limits:
+        new_limits = grow_limits(None if fresh else axis.get_ylim(), ylims)
+        if new_limits:
+            axis.set_ylim(new_limits, emit=False)
+            limits_grew = True
+
+def update_blit(i):
+    """Updates a blitted animation, returning True when the limits
+    changed and the background needs to be redrawn"""
+    global limits_grew
+    limits_grew = False
+    update_animate(i)
+    return limits_grew
+
 def freeze(event):
     debug("freezing")
-    for (axis_index, subplot) in enumerate(saved_plots):
-        for entry in subplot:
-            plot_entry = entry
-
-            # skip non-data entries like images
-            if 'data' not in plot_entry:
-                continue
-
-            # gather the x axis data
-            xdata = plot_entry['data'][plot_entry['x']]
-            if 'xoff' in plot_entry['options']:
-                xdata = xdata + float(plot_entry['options']['xoff'])
-
-            if 'last' in plot_entry['options']:
-                xdata = xdata[-int(plot_entry['options']['last']):-1]
-
-            # gather all the associated y axis data
-            for y in plot_entry['y']:
-                ydata = plot_entry['data'][y]
-                if 'last' in plot_entry['options']:
-                    ydata = ydata[-int(plot_entry['options']['last']):-1]
-
-                if 'yoff' in plot_entry['options']:
-                    ydata = ydata + float(plot_entry['options']['yoff'])
-
-                verts = []
-                codes = [Path.MOVETO]
-                for x, y in zip(xdata,ydata):
-                    verts.append((x,y))
-                    codes.append(Path.LINETO)
-
-                codes = codes[:-2]
-                path = Path(verts)
-
-                patch = matplotlib.patches.PathPatch(path, facecolor="grey",
-                                                     color="grey", fill=False,
-                                                     linestyle=":")
-                axis = plot_entry['axis']
-                patch.set_transform(axis.transData)
-                axis.add_patch(patch)
-                debug("added:" + str(plot_entry['y']))
-
-
-
-            if 'x_axis_set' in plot_entry:
-                update_x_limits = False
+    for plan in render_plan.entries:
+        # skip entries without any data yet
+        columns = plan.entry.get('columns')
+        if columns is None:
+            continue
 
-            if 'y_axis_set' in plot_entry:
-                update_y_limits = False
+        # gather the x axis data
+        xdata = columns[plan.x][-plan.last:]
 
+        # gather all the associated y axis data
+        for (y, line) in zip(plan.ys, plan.lines):
+            ydata = columns[y][-plan.last:]
 
+            # there's no need to keep more points than can be seen
+            (xdata_kept, ydata_kept) = pixel_decimate(xdata, ydata,
+                                                      line.get_transform())
+            add_frozen_track(line.axes,
+                             np.column_stack([xdata_kept + plan.xoffset,
+                                              ydata_kept + plan.yoffset]))
+            debug("added:" + str(y))
 
     for data_source in data_sources:
         data_source.clear_data()
     
     clear_data(event)
 
+    if blitting:
+        anim.redraw() # the frozen tracks are part of the background now
+
+def add_frozen_track(axis, track):
+    """Adds a track (an array of x, y points) to the axis's collection of
+    frozen tracks, so they're all drawn together"""
+    collection = frozen_tracks.get(axis)
+    if collection is None:
+        # (drawn under the animated lines, like patches)
+        collection = LineCollection([], colors="grey", linestyles=":",
+                                    zorder=1)
+        axis.add_collection(collection, autolim=False)
+        frozen_tracks[axis] = collection
+    collection.set_segments(collection.get_segments() + [track])
+
 def save_data_btn(event):
     now = str(time.time())
     debug("saving...")
     for count, plot_entry in enumerate(plot_info):
         # will return a pandas dataframe with x, y
-        plot_entry['data'].to_csv(now + "-" + str(count) + ".csv",
+        entry_data(plot_entry).to_csv(now + "-" + str(count) + ".csv",
                                   index_label="index")
     
 
@@ -324,6 +435,11 @@ def clear_data(event):
     """Called on a button push for live animations to clear the current plots"""
     for data_source in data_sources:
         data_source.clear_data()
+    # start the data (and its extents) over on the next frame
+    for table_gather in table_gathers:
+        table_gather.reset()
+    # let the limits fit the new data
+    limited_axes.clear()
 
 paused = False
 def pause(event):
@@ -528,7 +644,8 @@ def setup_datasource(entry):
             source = None
 
         elif entry['options']['data_source'] == 'log':
-            log_source = LogLoader(sources=[str(entry['options']['file'])])
+            log_source = LogLoader(sources=[str(entry['options']['file'])],
+                                   **log_options)
             
             entry['data_source'] = log_source
             log_source.open()
@@ -605,7 +722,7 @@ def create_matplotlib_plots(plot_info, animate=False, scatter=False):
         (x, ys) = (plot_entry['x'], plot_entry['y'])
 
         # These will store the x,y data for each plot
-        x_data = plot_entry['data'][x]
+        x_data = plot_entry['columns'][x]
         if 'xoff' in plot_entry['options']:
             x_data = x_data + float(plot_entry['options']['xoff'])
 
@@ -627,7 +744,7 @@ def create_matplotlib_plots(plot_info, animate=False, scatter=False):
             plot_entry['y_axis_set'] = True
             
         for y in ys:
-            y_data = plot_entry['data'][y]
+            y_data = plot_entry['columns'][y]
             if 'yoff' in plot_entry['options']:
                 y_data = y_data + float(plot_entry['options']['yoff'])
 
@@ -653,18 +770,24 @@ def create_matplotlib_plots(plot_info, animate=False, scatter=False):
                     p = plot_entry['axis'].plot([], [], label=y, ms=marker_size,
                                                 color=color)
 
-                plot_entry['plot'] = p[0]
+                if 'xoff' in plot_entry['options'] or 'yoff' in plot_entry['options']:
+                    p[0].set_transform(offset_transform(plot_entry))
+
+                plot_entry.setdefault('lines', []).append(p[0])
                 animate_plots.append(p[0])
 
             else:
+                # drawn with all the data (so the limits fit all of it),
+                # which is decimated once the figure's size is known
                 if scatter:
-                    plot_entry['axis'].scatter(x_data, y_data, label=y,
-                                               marker = '.', s=marker_size,
-                                                color=color)
+                    p = plot_entry['axis'].scatter(x_data, y_data, label=y,
+                                                   marker = '.', s=marker_size,
+                                                   color=color)
                 else:            
-                    plot_entry['axis'].plot(x_data, y_data, label=y,
-                                            ms=marker_size,
-                                            color=color)
+                    p = plot_entry['axis'].plot(x_data, y_data, label=y,
+                                                ms=marker_size,
+                                                color=color)[0]
+                decimator.keep(p, x_data, y_data)
     
     
 
@@ -691,12 +814,41 @@ def main():
     # What are we plotting?  -- open the stream
 
     # Create the data source object where we'll extract data from
+    # (the log options are also used for any data_source: log plots)
+    cache = None
+    if args.mmap and args.no_cache:
+        sys.stderr.write("--mmap requires the log file cache (remove --no-cache)\n")
+        exit(1)
+
+    if not args.no_cache:
+        cache = ColumnCache(args.cache_dir, args.cache_size)
+        if args.clear_cache:
+            cache.clear()
+
+    global log_options
+    log_options = {'animation_frames': args.animation_frames,
+                   'lazy': args.lazy,
+                   'workers': args.jobs,
+                   'cache': cache,
+                   'mmap': args.mmap,
+                   'stream': args.stream,
+                   'stream_rows': args.stream_rows,
+                   'time_range': args.time_range,
+                   'follow': args.follow,
+                   'compact': args.compact,
+                   'join_tolerance': args.join_tolerance}
+
     if args.log_files:
-        default_data_source = LogLoader(animation_frames=args.animation_frames,
-                                        sources=args.log_files)
+        default_data_source = LogLoader(sources=args.log_files, **log_options)
 
     elif args.network_server:
-        default_data_source = NetworkTablesLoader(args.network_server, plots)
+        default_data_source = NetworkTablesLoader(args.network_server, plots,
+                                                  time_range=args.time_range,
+                                                  compact=args.compact,
+                                                  retention_rows=args.retention_rows,
+                                                  retention_seconds=args.retention_seconds,
+                                                  listen=args.listen,
+                                                  collect_rate=args.collect_rate)
         
     else:
         sys.stderr.write("either a log file list (-L) or a network server (-N) is needed")
@@ -768,11 +920,20 @@ def main():
             default_data_source.setup_table_entry(xident[-1], yident)
         plot_info.append(all_data_entry)
 
+    # let the sources know which columns we'll actually be using
+    for plot_entry in plot_info:
+        plot_entry['data_source'].require_columns(plot_entry['xident'],
+                                                  plot_entry['yidents'])
+
     # gather the data we need to plot
     # (for animation or network tables this will only gather a small sample)
+    global table_gathers
+    table_gathers = group_entries(plot_info)
     gather_new_data(plot_info, args.animate)
 
     create_matplotlib_plots(plot_info, args.animate, args.scatter_plot)
+    global render_plan
+    render_plan = compile_plan(saved_plots)
 
     # marker_columns will contain a list of column names to used
     # to mark the graphs.  If it contains commas, we'll split it into
@@ -821,6 +982,9 @@ def main():
     fig.set_size_inches(11,7.5)
     matplotlib.rcParams.update({'font.size': 10})
 
+    # only draw as much of the data as can be seen at this size
+    decimator.redo_all()
+
     if args.output_file:
         # save the results to the requested output file
         plt.savefig(args.output_file)
@@ -829,10 +993,16 @@ def main():
         if args.animate:
             # ...possibly using animation
             global anim
-            anim = FuncAnimation(fig, update_animate,
-                                 init_func=init_animate,
-#                                 frames=int(len(animate_data[0][0]) / animate_frames),
-                                 interval=args.animation_interval, blit=False)
+            if args.blit:
+                global blitting
+                blitting = True
+                anim = BlitAnimation(fig, update_blit, animate_plots,
+                                     interval=args.animation_interval)
+            else:
+                anim = FuncAnimation(fig, update_animate,
+                                     init_func=init_animate,
+#                                     frames=int(len(animate_data[0][0]) / animate_frames),
+                                     interval=args.animation_interval, blit=False)
 
             axnext = plt.axes([0.0, 0.0, 0.05, 0.05])
             button = matplotlib.widgets.Button(axnext, 'clear')
@@ -1,74 +1,263 @@
-"""A test server for re-transmitting CSV files over networktables"""
+"""A test server for re-transmitting CSV files (or generated data) over
+networktables"""
 
+import argparse
+import os.path
 import time
 import logging
-import re
-import sys
+from logging import debug, info
+
+import numpy as np
 
 from networktables import NetworkTables
-from frc1678.limeplotter.logloader import LogLoader
+from frc1678.limeplotter.loader.log import LogLoader, COMPRESSION_SUFFIXES
+from frc1678.limeplotter.loader.collector import Collector
+
+def parse_args():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+                                     epilog="Example usage: lime-server -s 10 LOGDIR")
+
+    parser.add_argument("-s", "--speed", default=1.0, type=float,
+                        help="Replay speed relative to the log's timestamps (eg, .5, 1, 10; 0 = as fast as possible)")
+
+    parser.add_argument("--loop", action="store_true",
+                        help="Start over from the beginning when the end of the logs is reached")
+
+    parser.add_argument("-u", "--update-interval", default=.01, type=float,
+                        help="How often networktables sends out changed values (seconds; .01 to 1)")
+
+    parser.add_argument("-r", "--report-interval", default=5, type=float,
+                        help="How often to report the achieved publishing rate (seconds)")
+
+    group = parser.add_argument_group("Generated data")
+
+    group.add_argument("-G", "--generate", nargs=2, type=int,
+                       metavar=("TABLES", "KEYS"),
+                       help="Publish generated data for this many tables of this many keys each instead of replaying logs")
+
+    group.add_argument("--rate", default=50, type=float,
+                       help="How many times per second to update the generated data")
+
+    group.add_argument("--duration", default=0, type=float,
+                       help="Stop generating data after this many seconds (0 = never)")
+
+    parser.add_argument("--log-level", "--ll", default="info",
+                        help="Define the logging verbosity level (debug, info, warning, error, fotal, critical).")
+
+    parser.add_argument("sources", type=str, nargs='*',
+                        default=["573/superstructure_status.csv"],
+                        help="The log files (or directories of them) to replay together")
+
+    return parser.parse_args()
+
+def log_table_name(path):
+    """Returns the table name to publish a log file's columns under:
+    its file name without the .csv (or compression) suffix"""
+    name = os.path.basename(os.path.normpath(path))
+    for suffix in COMPRESSION_SUFFIXES:
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    if name.endswith(".csv"):
+        name = name[:-len(".csv")]
+    return name
 
 class NetworkTablesServer():
-    def __init__(self, logfiles):
+    def __init__(self, logfiles, speed = 1.0, loop = False,
+                 update_interval = .01, report_interval = 5):
         self._logfiles = logfiles
         if type(self._logfiles) != list:
             self._logfiles = [self._logfiles]
+        self._speed = speed
+        self._loop = loop
+        self._update_interval = update_interval
+        self._report_interval = report_interval
 
     def open(self):
         # get our log data
         log_loader = LogLoader(sources=self._logfiles)
-        self._log_loader = log_loader
         log_loader.open()
-        self._vars = log_loader.variables_available
-        self._index = 0
-
-        logging.basicConfig(level=logging.DEBUG)
 
         # init the net tables
         NetworkTables.initialize()
+        NetworkTables.setUpdateRate(self._update_interval)
 
-        # get tables and columns
+        # convert each table to arrays up front so publishing a row is
+        # just a loop over its values
         self._tables = {}
-        for filename in self._vars.keys():
-            tablename = filename
-            tablename = re.sub(".*/", "", tablename)
-            tablename = re.sub(".csv", "", tablename)
-            print(tablename)
-            for column in self._vars[filename]:
-                print("  "+column)
-            self._tables[tablename] = { 'nettable': NetworkTables.getTable(tablename),
-                                        'columns': self._vars[filename],
-                                        'table': tablename,
-                                        'index': filename,
-            #                            'data': self._data[table]
+        for (path, df) in log_loader.dataframes.items():
+            tablename = log_table_name(path)
+            time_column = log_loader.time_column(path)
+            columns = [column for column in df.columns
+                       if column != 'timestamp'
+                       and df[column].dtype.kind in 'biuf']
+            skipped = [column for column in df.columns
+                       if column not in columns and column != 'timestamp']
+            if skipped:
+                debug(f"{tablename}: not publishing non-numeric columns {skipped}")
+            info(f"{tablename}: {len(df.index)} rows of {', '.join(columns)}")
+
+            self._tables[tablename] = {
+                'nettable': NetworkTables.getTable(tablename),
+                'columns': columns,
+                'times': df[time_column].to_numpy(dtype=float),
+                'values': df[columns].to_numpy(dtype=float),
             }
 
-    def transmit(self):
-        self._log_loader.gather_next_datasets()
-        for tablename in self._tables:
-            for column in self._tables[tablename]['columns']:
-                if column == 'timestamp':
-                    continue
-                data = self._log_loader.gather([self._tables[tablename]['index'], 'timestamp'],
-                                               [[self._tables[tablename]['index'], column]], True)
-                #print(column + ": " + str(data[column][-2:-1]))
-                try:
-                    self._tables[tablename]['nettable'].putNumber(column, data[column][-2:-1])
-                except:
-                    pass
+        self.merge_tables()
+
+    def merge_tables(self):
+        """Puts every row of every table onto one timeline, ordered by
+        their times.  The tables are each (nearly always) already in
+        order, so the stable sort amounts to a k-way merge of them, and
+        rows with the same time stay in table and then row order."""
+        self._table_names = list(self._tables.keys())
+        times = [self._tables[name]['times'] for name in self._table_names]
+        if not times:
+            self._timeline = (np.array([]), np.array([]), np.array([]))
+            return
+
+        tables = [np.full(len(table_times), number)
+                  for (number, table_times) in enumerate(times)]
+        rows = [np.arange(len(table_times)) for table_times in times]
+        times = np.concatenate(times)
+        order = np.argsort(times, kind='stable')
+        self._timeline = (times[order],
+                          np.concatenate(tables)[order],
+                          np.concatenate(rows)[order])
+
+    def publish_row(self, tablename, row):
+        table = self._tables[tablename]
+        nettable = table['nettable']
+        for (column, value) in zip(table['columns'],
+                                   table['values'][row].tolist()):
+            nettable.putNumber(column, value)
+        return len(table['columns'])
+
+    def replay(self):
+        """Publishes every row of every table when it becomes due on the
+        merged timeline"""
+        (times, tables, rows) = self._timeline
+        if len(times) == 0:
+            return
+
+        start = time.monotonic()
+        first_time = times[0]
+        self._rows = 0
+        self._values = 0
+        self._report_start = start
+        for (when, table, row) in zip(times.tolist(), tables.tolist(),
+                                      rows.tolist()):
+            if self._speed:
+                due = start + (when - first_time) / self._speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            self._values += self.publish_row(self._table_names[table], row)
+            self._rows += 1
+            self.report()
+        self.report(force=True)
+
+    def report(self, force = False):
+        now = time.monotonic()
+        elapsed = now - self._report_start
+        if elapsed < self._report_interval and not force:
+            return
+        if elapsed > 0:
+            info(f"published {self._rows / elapsed:.0f} rows/s ({self._values / elapsed:.0f} values/s)")
+        self._rows = 0
+        self._values = 0
+        self._report_start = now
+
+    def run(self):
+        self.replay()
+        while self._loop:
+            self.replay()
+
+class LoadGenerator():
+    """Publishes generated data for load testing: 'tables' tables
+    (generated_0, ...) of 'keys' keys (key_0, ...) each, all updated
+    'rate' times a second.  Every key is a sine wave with its own
+    frequency and phase, so runs are repeatable.  Each table also
+    gets a 'tick' counter and the 'sent_time' it was published at, so
+    receivers can measure their latency and any updates they missed."""
+
+    def __init__(self, tables = 1, keys = 10, rate = 50,
+                 update_interval = .01, report_interval = 5, duration = 0):
+        self._table_count = tables
+        self._key_count = keys
+        self._rate = rate
+        self._update_interval = update_interval
+        self._report_interval = report_interval
+        self._duration = duration
+        self._tick = 0
+
+    def open(self):
+        NetworkTables.initialize()
+        NetworkTables.setUpdateRate(self._update_interval)
+
+        self._nettables = [NetworkTables.getTable(f"generated_{number}")
+                           for number in range(self._table_count)]
+        self._keys = [f"key_{number}" for number in range(self._key_count)]
+
+        numbers = np.arange(self._table_count * self._key_count)
+        numbers = numbers.reshape(self._table_count, self._key_count)
+        self._frequencies = 2 * np.pi * (.1 + (numbers % 17) * .05)
+        self._phases = numbers * .3
+
+    def publish(self):
+        when = self._tick / self._rate
+        values = np.sin(self._frequencies * when + self._phases).tolist()
+        now = time.time()
+        for (nettable, row) in zip(self._nettables, values):
+            for (key, value) in zip(self._keys, row):
+                nettable.putNumber(key, value)
+            nettable.putNumber('tick', self._tick)
+            nettable.putNumber('sent_time', now)
+        self._tick += 1
+
+    def run(self):
+        info(f"generating {self._table_count} tables of {self._key_count} keys at {self._rate}Hz")
+        collector = Collector(self.publish, self._rate,
+                              report_interval=self._report_interval,
+                              name="generator")
+        start = last_report = time.monotonic()
+        last_tick = 0
+        collector.start()
+        try:
+            while (not self._duration
+                   or time.monotonic() - start < self._duration):
+                time.sleep(.1)
+                now = time.monotonic()
+                if now - last_report >= self._report_interval:
+                    updates = (self._tick - last_tick) / (now - last_report)
+                    values = updates * self._table_count * self._key_count
+                    info(f"published {updates:.1f} updates/s ({values:.0f} values/s)")
+                    (last_report, last_tick) = (now, self._tick)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            collector.stop()
 
 def main():
-    source = "573/superstructure_status.csv"
-    if len(sys.argv) > 1:
-        source = sys.argv[1]
-    nts = NetworkTablesServer(source)
-    nts.open()
+    args = parse_args()
+    logging.basicConfig(level=args.log_level.upper(),
+                        format="%(levelname)-10s:\t%(message)s")
+
+    if args.generate:
+        generator = LoadGenerator(args.generate[0], args.generate[1],
+                                  rate=args.rate,
+                                  update_interval=args.update_interval,
+                                  report_interval=args.report_interval,
+                                  duration=args.duration)
+        generator.open()
+        generator.run()
+        return
 
-    while True:
-        nts.transmit()
-        time.sleep(.002)
+    nts = NetworkTablesServer(args.sources, speed=args.speed, loop=args.loop,
+                              update_interval=args.update_interval,
+                              report_interval=args.report_interval)
+    nts.open()
+    nts.run()
 
 if __name__ == "__main__":
     main()
-
-        
@@ -0,0 +1,53 @@
+"""A render plan: the plot specification compiled once (after the plots
+are created) into flat lists of what to draw on each animation frame,
+so the animation loop doesn't look anything up in the configuration"""
+
+class EntryPlan():
+    """The lines animated from one plot entry: each of its y columns
+    against its x column, drawn with its offsets and 'last' window"""
+    __slots__ = ('entry', 'axis_index', 'x', 'ys', 'lines',
+                 'xoffset', 'yoffset', 'last')
+
+    def __init__(self, entry, axis_index):
+        options = entry['options']
+        self.entry = entry
+        self.axis_index = axis_index
+        self.x = entry['x']
+        self.ys = tuple(entry['y'])
+        self.lines = tuple(entry['lines'])
+        self.xoffset = float(options.get('xoff', 0))
+        self.yoffset = float(options.get('yoff', 0))
+        self.last = int(options.get('last', 0)) # 0 = everything
+
+class AxisPlan():
+    """An axis with animated lines, and whether its limits follow the
+    data (ie, they weren't fixed by the configuration)"""
+    __slots__ = ('axis', 'update_x_limits', 'update_y_limits')
+
+    def __init__(self, axis, entries):
+        self.axis = axis
+        self.update_x_limits = not any('x_axis_set' in entry for entry in entries)
+        self.update_y_limits = not any('y_axis_set' in entry for entry in entries)
+
+class RenderPlan():
+    """Every animated plot entry (in drawing order) and every axis they're
+    drawn on; each EntryPlan's axis_index is its position in axes"""
+    __slots__ = ('entries', 'axes')
+
+    def __init__(self, entries, axes):
+        self.entries = tuple(entries)
+        self.axes = tuple(axes)
+
+def compile_plan(plots):
+    """Compiles the subplots (lists of plot entries, as created from a
+    YAML file or the -p arguments) into a RenderPlan.  Only entries
+    with animated lines (see create_matplotlib_plots) are included."""
+    entries = []
+    axes = []
+    for subplot in plots:
+        animated = [entry for entry in subplot if 'lines' in entry]
+        if not animated:
+            continue
+        axes.append(AxisPlan(animated[0]['axis'], animated))
+        entries.extend([EntryPlan(entry, len(axes) - 1) for entry in animated])
+    return RenderPlan(entries, axes)
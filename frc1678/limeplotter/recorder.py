@@ -0,0 +1,142 @@
+"""lime-record: records everything published over networktables to disk,
+without needing a display.
+
+Every table is recorded into its own directory of numbered, compressed
+NumPy (.npz) segment files, which lime-plotter can plot directly:
+
+    lime-record -N 10.0.0.1 -o practice
+    lime-plotter -L practice -y plots.yml
+"""
+
+import argparse
+import os
+import os.path
+import time
+
+import numpy as np
+
+from logging import debug, info, basicConfig
+
+from frc1678.limeplotter.loader.networktables import NetworkTablesLoader, DEFAULT_TIMESTAMP
+from frc1678.limeplotter.loader.log import SEGMENT_SUFFIX
+
+def parse_args():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+                                     epilog="Example usage: lime-record -N 10.0.0.1 -o practice")
+
+    parser.add_argument("-N", "--network-server", type=str, required=True,
+                        help="NetworkTables server address to record data from")
+
+    parser.add_argument("-o", "--output-directory", type=str,
+                        default=time.strftime("lime-record-%Y%m%d-%H%M%S"),
+                        help="The directory to write the recording to")
+
+    parser.add_argument("--segment-rows", default=100000, type=int,
+                        help="Write a new segment once this many rows have been collected")
+
+    parser.add_argument("--segment-seconds", default=60, type=float,
+                        help="Write a new segment at least this often (seconds)")
+
+    parser.add_argument("--discover-interval", default=5, type=float,
+                        help="How often to look for newly published tables and keys (seconds)")
+
+    parser.add_argument("--compact", action="store_true",
+                        help="Record values as 4 byte floats")
+
+    parser.add_argument("--log-level", "--ll", default="info",
+                        help="Define the logging verbosity level (debug, info, warning, error, fotal, critical).")
+
+    return parser.parse_args()
+
+class Recorder():
+    """Listens for every value change on every networktables table and
+    writes them out in segment files, rotating to a new segment when
+    enough rows or time have accumulated."""
+
+    def __init__(self, server, directory, segment_rows = 100000,
+                 segment_seconds = 60, discover_interval = 5,
+                 compact = False):
+        self._directory = directory
+        self._segment_rows = segment_rows
+        self._segment_seconds = segment_seconds
+        self._discover_interval = discover_interval
+        self._segment = 0
+        self._rows = 0
+        self._loader = NetworkTablesLoader(server, plots=[], listen=True,
+                                           compact=compact)
+
+    def open(self):
+        os.makedirs(self._directory, exist_ok=True)
+        # continue after any segments already in the directory
+        for (directory, subdirectories, filenames) in os.walk(self._directory):
+            for filename in filenames:
+                if filename.endswith(SEGMENT_SUFFIX):
+                    number = int(filename[:-len(SEGMENT_SUFFIX)])
+                    self._segment = max(self._segment, number + 1)
+        self._loader.open()
+        info("waiting for the networktables server")
+        self._loader.variables_available # waits for the connection
+        self.discover()
+
+    def discover(self):
+        """Starts recording any tables and keys we aren't recording yet"""
+        tables = self._loader.discover_tables()
+        for table in tables:
+            for key in tables[table]:
+                self._loader.setup_table_entry(DEFAULT_TIMESTAMP, [table, key])
+        self._loader.start_listening()
+
+    def segment_file(self, table):
+        return os.path.join(self._directory, table,
+                            f"{self._segment:06d}{SEGMENT_SUFFIX}")
+
+    def flush(self):
+        """Writes everything collected so far into a new segment"""
+        data = self._loader.take_data()
+        if not data:
+            return
+
+        rows = 0
+        for table in data:
+            os.makedirs(os.path.join(self._directory, table), exist_ok=True)
+            np.savez_compressed(self.segment_file(table), **data[table])
+            rows += len(data[table]['walltime'])
+        debug(f"wrote segment {self._segment} ({rows} rows)")
+        self._segment += 1
+        self._rows += rows
+
+    def run(self):
+        last_flush = last_discover = time.monotonic()
+        try:
+            while True:
+                time.sleep(.1)
+                now = time.monotonic()
+                if now - last_discover >= self._discover_interval:
+                    self.discover()
+                    last_discover = now
+                if (self._loader.collected_rows >= self._segment_rows
+                    or now - last_flush >= self._segment_seconds):
+                    self.flush()
+                    last_flush = now
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.flush()
+            info(f"recorded {self._rows} rows in {self._segment} segments to {self._directory}")
+
+def main():
+    args = parse_args()
+    basicConfig(level=args.log_level.upper(),
+                format="%(levelname)-10s:\t%(message)s")
+
+    recorder = Recorder(args.network_server, args.output_directory,
+                        segment_rows=args.segment_rows,
+                        segment_seconds=args.segment_seconds,
+                        discover_interval=args.discover_interval,
+                        compact=args.compact)
+    recorder.open()
+    info(f"recording to {args.output_directory} (control-c to stop)")
+    recorder.run()
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,7 @@ setuptools.setup(
         'console_scripts': [
             'lime-plotter = frc1678.limeplotter.main:main',
             'lime-server = frc1678.limeplotter.networktablesserver:main',
+            'lime-record = frc1678.limeplotter.recorder:main',
         ]
     },
     classifiers=[
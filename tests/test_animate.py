@@ -0,0 +1,41 @@
+"""Drives the animation loop without a display"""
+
+import sys
+
+import matplotlib
+matplotlib.use("Agg")
+
+import numpy as np
+import pandas as pd
+
+import frc1678.limeplotter.main as lime_plotter
+
+def write_log(path, rows = 50):
+    timestamps = np.arange(rows) * .02
+    pd.DataFrame({'timestamp': timestamps,
+                  'X_position': np.cos(timestamps),
+                  'Y_position': np.sin(timestamps)}).to_csv(path, index=False)
+
+def start_animation(monkeypatch, tmp_path, arguments):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setattr(sys, "argv", ["lime-plotter", "-a", "--no-cache"]
+                        + arguments)
+    lime_plotter.main()
+
+def test_animate_after_clear(monkeypatch, tmp_path):
+    log = tmp_path / "drivetrain_status.csv"
+    write_log(log)
+    start_animation(monkeypatch, tmp_path,
+                    ["-f", "10", "-L", str(log),
+                     "-p", "X_position,Y_position", "Y_position"])
+
+    # play past the end of the log, clear it and keep going
+    for frame in range(10):
+        lime_plotter.update_animate(frame)
+    lime_plotter.clear_data(None)
+    for frame in range(3):
+        lines = lime_plotter.update_animate(frame)
+
+    assert len(lines) == 2
+    for line in lines:
+        assert len(line.get_xdata()) == 0
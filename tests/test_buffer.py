@@ -0,0 +1,70 @@
+"""Column storage for rows that arrive one at a time"""
+
+import numpy as np
+import pytest
+
+from frc1678.limeplotter.loader.buffer import TableBuffer
+
+def filled(buffer, rows, first = 0, delta = .02):
+    for row in range(first, first + rows):
+        buffer.append({'v': row}, row * delta)
+    return buffer
+
+def table(**kwargs):
+    buffer = TableBuffer(**kwargs)
+    buffer.add_column('v')
+    buffer.add_column('mode', object)
+    return buffer
+
+def test_grows_without_limits():
+    buffer = filled(table(capacity=4), 1000)
+    assert len(buffer) == 1000 and buffer.dropped == 0
+    np.testing.assert_array_equal(buffer.view('v'), np.arange(1000))
+    assert np.isnan(buffer.view('mode').astype(float)).all()
+
+def test_max_rows():
+    buffer = filled(table(max_rows=50), 1000)
+    assert len(buffer) == 50 and buffer.dropped == 950
+    np.testing.assert_array_equal(buffer.view('v'), np.arange(950, 1000))
+    np.testing.assert_allclose(buffer.times(), np.arange(950, 1000) * .02)
+
+    buffer.extend({'v': np.arange(1000, 1120)}, np.arange(1000, 1120) * .02)
+    assert len(buffer) == 50 and buffer.dropped == 1070
+    np.testing.assert_array_equal(buffer.view('v'), np.arange(1070, 1120))
+
+def test_max_seconds():
+    buffer = filled(table(capacity=16, max_seconds=1.0), 1000)
+    # (everything within a second of the newest row)
+    times = buffer.times()
+    assert times[-1] - times[0] <= 1.0
+    assert len(buffer) == 51 and buffer.dropped == 949
+    np.testing.assert_array_equal(buffer.view('v'), np.arange(949, 1000))
+
+def test_views_stay_valid_after_growing():
+    buffer = filled(table(capacity=4), 4)
+    view = buffer.view('v')
+    filled(buffer, 100, 4) # (into new, bigger arrays)
+    np.testing.assert_array_equal(view, np.arange(4))
+    np.testing.assert_array_equal(buffer.view('v'), np.arange(104))
+
+@pytest.mark.parametrize("kwargs", [{'max_rows': 10},
+                                    {'capacity': 8, 'max_seconds': .1}])
+def test_views_stay_valid_after_dropping(kwargs):
+    buffer = filled(table(**kwargs), 10)
+    view = buffer.view('v')
+    expected = view.copy()
+    filled(buffer, 500, 10)
+    np.testing.assert_array_equal(view, expected)
+
+def test_views_are_read_only():
+    buffer = filled(table(), 3)
+    with pytest.raises(ValueError):
+        buffer.view('v')[0] = 7
+
+def test_clear():
+    buffer = filled(table(), 10)
+    buffer.clear()
+    assert len(buffer) == 0 and buffer.dropped == 10
+    assert buffer.columns == ['v', 'mode']
+    filled(buffer, 2)
+    np.testing.assert_array_equal(buffer.view('v'), [0, 1])
@@ -0,0 +1,102 @@
+"""The on-disk cache of parsed log columns"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from frc1678.limeplotter.loader.cache import ColumnCache, INFO_FILE
+
+def write_log(path, rows = 100):
+    times = np.arange(rows) * .02
+    pd.DataFrame({'timestamp': times, 'v': times * 2}).to_csv(path, index=False)
+    return path
+
+def cached(cache, path):
+    cache.store(path, ['timestamp', 'v'], False,
+                {'v': np.arange(1000, dtype=np.float64)})
+    return cache.entry_directory(path)
+
+def last_used(cache, path, when):
+    info = os.path.join(cache.entry_directory(path), INFO_FILE)
+    os.utime(info, (when, when))
+
+def test_lookup(tmp_path):
+    cache = ColumnCache(str(tmp_path / "cache"))
+    log = write_log(str(tmp_path / "a.csv"))
+    assert cache.lookup(log) is None
+    cached(cache, log)
+    info = cache.lookup(log)
+    assert info['columns'] == ['timestamp', 'v']
+    assert info['cached'] == ['v'] and info['rows'] == 1000
+    np.testing.assert_array_equal(cache.load(log, ['v', 'timestamp'])['v'],
+                                  np.arange(1000))
+
+def test_size_change_invalidates(tmp_path):
+    cache = ColumnCache(str(tmp_path / "cache"))
+    log = write_log(str(tmp_path / "a.csv"))
+    directory = cached(cache, log)
+    with open(log, "a") as fh:
+        fh.write("2.0,4.0\n")
+    assert cache.lookup(log) is None
+    assert not os.path.exists(directory)
+
+def test_mtime_change_invalidates(tmp_path):
+    cache = ColumnCache(str(tmp_path / "cache"))
+    log = write_log(str(tmp_path / "a.csv"))
+    directory = cached(cache, log)
+    # (rewritten with the same size)
+    stat = os.stat(log)
+    os.utime(log, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    assert cache.lookup(log) is None
+    assert not os.path.exists(directory)
+
+def test_evicts_least_recently_used(tmp_path):
+    logs = [write_log(str(tmp_path / f"{name}.csv")) for name in "abcd"]
+    cache = ColumnCache(str(tmp_path / "cache"))
+    cached(cache, logs[0])
+    entry_size = cache.entries()[0][1]
+    # room for three entries, but not four
+    cache = ColumnCache(str(tmp_path / "cache"),
+                        max_size = 3.5 * entry_size / (1024 * 1024))
+    for log in logs[1:3]:
+        cached(cache, log)
+    for (when, log) in enumerate(logs[:3]):
+        last_used(cache, log, 1000000 + when)
+    cache.lookup(logs[0]) # a is now the most recently used, then c, b
+
+    cached(cache, logs[3])
+    assert [cache.lookup(log) is not None for log in logs] \
+        == [True, False, True, True]
+
+def test_keeps_the_newest_entry(tmp_path):
+    cache = ColumnCache(str(tmp_path / "cache"), max_size = 0)
+    logs = [write_log(str(tmp_path / f"{name}.csv")) for name in "ab"]
+    cached(cache, logs[0])
+    cached(cache, logs[1])
+    assert [cache.lookup(log) is not None for log in logs] == [False, True]
+
+def test_convert(tmp_path):
+    cache = ColumnCache(str(tmp_path / "cache"))
+    log = str(tmp_path / "a.csv")
+    pd.DataFrame({'timestamp': np.arange(250) * .02,
+                  'mode': ['auto'] * 250}).to_csv(log, index=False)
+    # (the loader adds the made up localtime column to the log's columns)
+    assert cache.convert(log, ['timestamp', 'mode', 'localtime'], True,
+                         chunksize=100)
+    columns = cache.load(log, ['timestamp', 'mode', 'localtime'], mmap=True)
+    assert isinstance(columns['timestamp'], np.memmap)
+    np.testing.assert_allclose(columns['timestamp'], np.arange(250) * .02)
+    assert list(columns['mode']) == ['auto'] * 250
+    np.testing.assert_allclose(np.diff(columns['localtime']), .02)
+
+def test_convert_falls_back_when_not_always_numeric(tmp_path):
+    cache = ColumnCache(str(tmp_path / "cache"))
+    log = str(tmp_path / "a.csv")
+    # numbers (then nothing) in the first chunk, words in a later one
+    values = [str(row) for row in range(100)] + [''] * 100 + ['auto'] * 50
+    pd.DataFrame({'timestamp': np.arange(250) * .02,
+                  'mode': values}).to_csv(log, index=False)
+    assert not cache.convert(log, ['timestamp', 'mode'], False, chunksize=100)
+    assert cache.lookup(log) is None
+    assert not os.path.exists(cache.entry_directory(log))
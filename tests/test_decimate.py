@@ -0,0 +1,59 @@
+"""Which points decimation keeps"""
+
+import numpy as np
+import pytest
+
+from frc1678.limeplotter.decimate import lttb_indexes, minmax_indexes
+
+def pixel_columns(n, count, random):
+    return np.sort(random.integers(0, count, n))
+
+@pytest.mark.parametrize("missing", [0, .1])
+def test_minmax_keeps_every_extreme(missing):
+    random = np.random.default_rng(1678)
+    y = random.normal(size=5000).round(1) # (with ties)
+    y[random.random(len(y)) < missing] = np.nan
+    columns = pixel_columns(len(y), 300, random)
+    kept = minmax_indexes(y, columns)
+
+    assert (np.diff(kept) > 0).all()
+    for column in np.unique(columns):
+        (indexes,) = np.nonzero(columns == column)
+        values = y[indexes]
+        kept_here = np.intersect1d(kept, indexes)
+        assert indexes[0] in kept_here and indexes[-1] in kept_here
+        if np.isnan(values).all():
+            continue
+        assert np.nanmin(y[kept_here]) == np.nanmin(values)
+        assert np.nanmax(y[kept_here]) == np.nanmax(values)
+        if np.isnan(values).any():
+            assert np.isnan(y[kept_here]).any()
+        # at most the first, last, minimum, maximum and missing points
+        assert len(kept_here) <= 5
+
+def test_minmax_integers():
+    y = np.array([3, 9, 1, 4, 4, 7, 2, 8])
+    columns = np.array([0, 0, 0, 0, 1, 1, 1, 1])
+    assert list(minmax_indexes(y, columns)) == [0, 1, 2, 3, 4, 6, 7]
+
+@pytest.mark.parametrize("n,threshold", [(1000, 3), (1000, 100), (1001, 999),
+                                         (10, 9)])
+def test_lttb_threshold(n, threshold):
+    random = np.random.default_rng(1678)
+    x = np.arange(n) * .02
+    y = random.normal(size=n)
+    kept = lttb_indexes(x, y, threshold)
+    assert len(kept) == threshold
+    assert kept[0] == 0 and kept[-1] == n - 1
+    assert (np.diff(kept) > 0).all()
+
+def test_lttb_keeps_everything_under_threshold():
+    x = np.arange(10.0)
+    assert list(lttb_indexes(x, x, 10)) == list(range(10))
+    assert list(lttb_indexes(x, x, 50)) == list(range(10))
+
+def test_lttb_keeps_a_spike():
+    x = np.arange(1000.0)
+    y = np.zeros(1000)
+    y[437] = 100
+    assert 437 in lttb_indexes(x, y, 50)
@@ -0,0 +1,45 @@
+"""Running (min, max) extents against brute force"""
+
+import numpy as np
+import pytest
+
+from frc1678.limeplotter.extents import RunningExtents
+
+def brute_force(values, window):
+    if window:
+        values = values[-window:]
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return None
+    return (values.min(), values.max())
+
+@pytest.mark.parametrize("window", [None, 1, 5, 37])
+def test_extents(window):
+    random = np.random.default_rng(1678)
+    extents = RunningExtents(window)
+    held = np.array([])
+    for batch in range(200):
+        values = random.integers(-50, 50, random.integers(0, 60)).astype(float)
+        values[random.random(len(values)) < .1] = np.nan
+        extents.extend(values)
+        held = np.concatenate([held, values])
+        if random.random() < .3:
+            # forget some of the oldest rows, like a retention limit
+            rows = int(random.integers(0, len(held) + 2))
+            extents.drop(rows)
+            held = held[rows:]
+        assert extents.extents == brute_force(held, window)
+
+def test_integers():
+    extents = RunningExtents(3)
+    for value in [5, 1, 4, 4, 9, 2]:
+        extents.extend(np.array([value]))
+    assert extents.extents == (2, 9)
+
+def test_clear():
+    extents = RunningExtents()
+    extents.extend(np.array([1.0, 2.0]))
+    extents.clear()
+    assert extents.extents is None
+    extents.extend(np.array([7.0]))
+    assert extents.extents == (7.0, 7.0)
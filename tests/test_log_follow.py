@@ -0,0 +1,51 @@
+"""Following logs that are still being written"""
+
+import numpy as np
+
+from frc1678.limeplotter.loader.log import LogLoader
+
+def append(path, text):
+    with open(path, "a") as fh:
+        fh.write(text)
+
+def rows(first, count):
+    return "".join([f"{row * .02:.2f},{row},{-row}\n"
+                    for row in range(first, first + count)])
+
+def test_follow_new_log(tmp_path):
+    log = str(tmp_path / "drivetrain_status.csv")
+    open(log, "w").close()
+    loader = LogLoader(sources=[log], follow=True)
+    loader.open()
+    loader.gather_next_datasets()
+
+    append(log, "timestamp,X_pos") # not a complete header yet
+    loader.gather_next_datasets()
+    assert loader.find_column_table("X_position") is None
+
+    append(log, "ition,Y_position\n" + rows(0, 3))
+    loader.gather_next_datasets()
+    xident = loader.find_column_timestamp_identifier("X_position")
+    yidents = [loader.find_column_identifier("X_position")]
+    assert list(loader.gather(xident, yidents)["X_position"]) == [0, 1, 2]
+
+    append(log, rows(3, 2) + "0.1") # and part of a line
+    loader.gather_next_datasets()
+    assert list(loader.gather(xident, yidents)["X_position"]) == [0, 1, 2, 3, 4]
+
+def test_follow_columns_and_time_range(tmp_path):
+    log = str(tmp_path / "drivetrain_status.csv")
+    append(log, "timestamp,X_position,Y_position\n" + rows(0, 30))
+    loader = LogLoader(sources=[log], follow=True, time_range=(.5, 1.0))
+    loader.open()
+    xident = [log, "timestamp"]
+    yidents = [[log, "Y_position"]]
+
+    append(log, rows(30, 50))
+    loader.gather_next_datasets()
+    df = loader.gather(xident, yidents)
+    assert list(df.columns) == ["timestamp", "Y_position"]
+    np.testing.assert_allclose(df["timestamp"], np.arange(25, 51) * .02)
+    assert "X_position" not in loader.dataframes[log]
+    # rows are numbered by the ones kept
+    assert list(df.index) == list(range(26))
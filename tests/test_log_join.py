@@ -0,0 +1,61 @@
+"""Joining columns from different logs on their timestamps"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from frc1678.limeplotter.loader.log import LogLoader
+
+def write_logs(tmp_path):
+    drivetrain = str(tmp_path / "drivetrain_status.csv")
+    superstructure = str(tmp_path / "superstructure_status.csv")
+    times = np.arange(500) * .02
+    pd.DataFrame({'timestamp': times,
+                  'X_position': np.cos(times)}).to_csv(drivetrain, index=False)
+    # a slower log that starts later and stops earlier
+    times = .013 + np.arange(230) * .037
+    pd.DataFrame({'timestamp': times,
+                  'shooter_rpm': np.sin(times) * 1000}).to_csv(superstructure,
+                                                               index=False)
+    return (drivetrain, superstructure)
+
+def one_shot_join(drivetrain, superstructure, tolerance = None):
+    left = pd.read_csv(drivetrain)
+    right = pd.read_csv(superstructure)
+    joined = pd.merge_asof(left[['timestamp', 'X_position']],
+                           right[['timestamp', 'shooter_rpm']],
+                           on='timestamp', direction='nearest',
+                           tolerance=tolerance)
+    return joined[['X_position', 'shooter_rpm']]
+
+@pytest.mark.parametrize("tolerance", [None, .01])
+def test_join(tmp_path, tolerance):
+    (drivetrain, superstructure) = write_logs(tmp_path)
+    loader = LogLoader(sources=[drivetrain, superstructure],
+                       join_tolerance=tolerance)
+    loader.open()
+    xident = [drivetrain, 'X_position']
+    yidents = [[superstructure, 'shooter_rpm']]
+    joined = loader.gather(xident, yidents)
+    pd.testing.assert_frame_equal(joined.reset_index(drop=True),
+                                  one_shot_join(drivetrain, superstructure,
+                                                tolerance))
+    # a finished join is just handed back again
+    assert (loader.join_tables(xident, yidents)
+            is loader.join_tables(xident, yidents))
+
+@pytest.mark.parametrize("frames", [1, 7, 64])
+def test_streamed_join(tmp_path, frames):
+    (drivetrain, superstructure) = write_logs(tmp_path)
+    loader = LogLoader(sources=[drivetrain, superstructure], stream=True,
+                       animation_frames=frames)
+    loader.open()
+    xident = [drivetrain, 'X_position']
+    yidents = [[superstructure, 'shooter_rpm']]
+    loader.gather(xident, yidents)
+    for frame in range(600 // frames + 2):
+        loader.gather_next_datasets()
+        joined = loader.gather(xident, yidents)
+
+    pd.testing.assert_frame_equal(joined.reset_index(drop=True),
+                                  one_shot_join(drivetrain, superstructure))
@@ -0,0 +1,35 @@
+"""Gathered log columns are views of the loaded data, not copies"""
+
+import mmap
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from frc1678.limeplotter.loader.cache import ColumnCache
+from frc1678.limeplotter.loader.log import LogLoader
+
+def memory_mapped(array):
+    while array is not None:
+        if isinstance(array, (np.memmap, mmap.mmap)):
+            return True
+        array = getattr(array, 'base', None)
+    return False
+
+@pytest.mark.parametrize("animate", [False, True])
+def test_mmap_gather_is_a_view(tmp_path, animate):
+    log = str(tmp_path / "drivetrain_status.csv")
+    times = np.arange(1000) * .02
+    pd.DataFrame({'timestamp': times, 'v': np.sin(times),
+                  'mode': ['auto'] * 1000}).to_csv(log, index=False)
+    loader = LogLoader(sources=[log], mmap=True, animation_frames=100,
+                       cache=ColumnCache(str(tmp_path / "cache")))
+    loader.open()
+    loader.gather_next_datasets()
+
+    (rows, new, cursor) = loader.gather_held([log, 'timestamp'], [[log, 'v']],
+                                             None, animate)
+    assert new == (100 if animate else 1000)
+    column = rows['v'].to_numpy()
+    assert np.shares_memory(column, loader.dataframes[log]['v'].to_numpy())
+    assert memory_mapped(column)
@@ -0,0 +1,75 @@
+"""Recording network tables value changes as rows"""
+
+import numpy as np
+import pytest
+
+import frc1678.limeplotter.loader.networktables as networktables
+from frc1678.limeplotter.loader.networktables import (NetworkTablesLoader,
+                                                      UPDATE_SECONDS)
+
+class Clock():
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(networktables.time, "time", clock.time)
+    return clock
+
+@pytest.fixture
+def loader(clock):
+    loader = NetworkTablesLoader("127.0.0.1", plots=[], listen=True)
+    loader.open()
+    for key in ["a", "b", "c"]:
+        loader.setup_table_entry("localtime", ["robot", key])
+    loader._start_time = clock.now
+    return loader
+
+def change(loader, clock, key, value, after = 0):
+    clock.now += after
+    loader.value_changed("robot", None, key, value, False)
+
+def rows(loader):
+    df = loader.gather_columns(["robot", "localtime"],
+                               [["robot", "a"], ["robot", "b"], ["robot", "c"]])
+    return df.to_numpy().tolist()
+
+def test_one_update_is_one_row(loader, clock):
+    change(loader, clock, "a", 1)
+    change(loader, clock, "b", 2, UPDATE_SECONDS / 4)
+    change(loader, clock, "c", 3, UPDATE_SECONDS / 4)
+    # (timed by the first change)
+    assert rows(loader) == [[0, 1, 2, 3]]
+
+def test_repeated_key_starts_a_row(loader, clock):
+    change(loader, clock, "a", 1)
+    change(loader, clock, "b", 2, .001)
+    change(loader, clock, "a", 3, .001)
+    change(loader, clock, "c", 4, .001)
+    assert np.allclose(rows(loader), [[0, 1, 2, np.nan], [.002, 3, 2, 4]],
+                       equal_nan=True)
+
+def test_late_change_starts_a_row(loader, clock):
+    change(loader, clock, "a", 1)
+    change(loader, clock, "b", 2, UPDATE_SECONDS * 2)
+    assert np.allclose(rows(loader),
+                       [[0, 1, np.nan, np.nan],
+                        [UPDATE_SECONDS * 2, 1, 2, np.nan]], equal_nan=True)
+
+def test_open_rows_are_stored_when_gathered(loader, clock):
+    change(loader, clock, "a", 1)
+    assert len(rows(loader)) == 1
+    # a change after the row was stored starts a new one
+    change(loader, clock, "b", 2, .001)
+    assert len(rows(loader)) == 2
+
+def test_open_rows_are_taken_and_cleared(loader, clock):
+    change(loader, clock, "a", 1)
+    assert loader.take_data()["robot"]["a"].tolist() == [1]
+    change(loader, clock, "a", 2, .001)
+    loader.clear_data()
+    assert rows(loader) == []